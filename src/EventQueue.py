@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+from parameters import Config
+
+from heapq import heappush, heappop, heapify
+from bisect import insort
+
+class HeapQueue:
+	"""Event queue based on a binary heap
+	Events with the same date are returned in the order they were added
+	"""
+	def __init__(self, tick = None):
+		"""Creates an empty queue
+		tick        -- duration of a tick of the simulation (s), not used
+		"""
+		self.heap = []          # entries have the form (time, sequence number, event)
+		self.count = 0          # sequence number of the next event, used to break ties
+	
+	def __len__(self):
+		return len(self.heap)
+	
+	def push(self, time, event):
+		"""Adds an event to the queue
+		time        -- date of the event (s)
+		event       -- any object
+		"""
+		heappush(self.heap, (time, self.count, event))
+		self.count += 1
+	
+	def pushMany(self, times, events):
+		"""Adds a set of events to the queue
+		times       -- dates of the events (s)
+		events      -- objects, in the same order as the dates
+		"""
+		n = len(events)
+		entries = zip(times, xrange(self.count, self.count + n), events)
+		self.count += n
+		if n > len(self.heap):
+			# rebuilding the heap is cheaper than pushing the events one by one
+			self.heap.extend(entries)
+			heapify(self.heap)
+		else:
+			for entry in entries:
+				heappush(self.heap, entry)
+	
+	def peek(self):
+		"""Returns the date of the next event (inf if the queue is empty)"""
+		return self.heap[0][0] if len(self.heap) > 0 else float('inf')
+	
+	def pop(self):
+		"""Removes the next event from the queue
+		Returns the date of the event and the event
+		"""
+		time, n, event = heappop(self.heap)
+		return time, event
+
+class CalendarQueue:
+	"""Event queue based on a calendar (R. Brown, 1988): a circular array of B buckets, each covering a duration w
+	The dates are divided into slots of duration w, bucket i holding the events of slots i, i + B, i + 2B, etc.
+	The buckets initially cover one tick of the simulation, their number and width are adjusted as the queue grows and shrinks
+	so that each bucket holds a few events, which makes insertion and removal O(1) amortized
+	Events with the same date are returned in the order they were added
+	"""
+	def __init__(self, tick = None, size = 16):
+		"""Creates an empty queue
+		tick        -- duration of a tick of the simulation (s), initially covered by each bucket (default: SIM_TICK of the global parameters)
+		size        -- initial number of buckets, doubled or halved to stay close to the number of events
+		"""
+		self.width = tick if tick is not None else Config().SIM_TICK    # duration covered by a bucket (s)
+		self.buckets = [ [] for i in xrange(size) ]     # sorted lists of entries (time, sequence number, event)
+		self.length = 0
+		self.count = 0          # sequence number of the next event, used to break ties
+		self.current = 0        # slot being scanned, there is no event in earlier slots
+	
+	def __len__(self):
+		return self.length
+	
+	def push(self, time, event):
+		"""Adds an event to the queue
+		time        -- date of the event (s)
+		event       -- any object
+		"""
+		slot = int(time / self.width)
+		insort(self.buckets[slot % len(self.buckets)], (time, self.count, event))
+		self.count += 1
+		self.length += 1
+		if slot < self.current:
+			self.current = slot
+		if self.length > 2 * len(self.buckets):
+			self.resize(2 * len(self.buckets))
+	
+	def pushMany(self, times, events):
+		"""Adds a set of events to the queue
+		times       -- dates of the events (s)
+		events      -- objects, in the same order as the dates
+		"""
+		for time, event in zip(times, events):
+			self.push(time, event)
+	
+	def find(self):
+		"""Moves the scan to the bucket containing the next event
+		Returns the bucket
+		"""
+		buckets = self.buckets
+		n = len(buckets)
+		end = self.current + n
+		while self.current < end:
+			bucket = buckets[self.current % n]
+			if bucket and int(bucket[0][0] / self.width) <= self.current:
+				return bucket
+			self.current += 1
+		# no event in the coming year, look directly for the earliest one
+		time, k, event = min( bucket[0] for bucket in self.buckets if len(bucket) > 0 )
+		self.current = int(time / self.width)
+		return self.buckets[self.current % n]
+	
+	def peek(self):
+		"""Returns the date of the next event (inf if the queue is empty)"""
+		if self.length == 0:
+			return float('inf')
+		return self.find()[0][0]
+	
+	def pop(self):
+		"""Removes the next event from the queue
+		Returns the date of the event and the event
+		"""
+		if self.length == 0:
+			raise IndexError("pop from empty queue")
+		time, n, event = self.find().pop(0)
+		self.length -= 1
+		if len(self.buckets) > 16 and 2 * self.length < len(self.buckets):
+			self.resize(len(self.buckets) / 2)
+		return time, event
+	
+	def resize(self, size):
+		"""Changes the number of buckets, and adapts their width to the separation between the next events
+		size        -- new number of buckets
+		"""
+		entries = sorted( entry for bucket in self.buckets for entry in bucket )
+		# the width is set to three times the average separation of the next events, as recommended by Brown
+		sample = entries[:25]
+		if len(sample) > 1 and sample[-1][0] > sample[0][0]:
+			self.width = 3 * (sample[-1][0] - sample[0][0]) / (len(sample) - 1)
+		self.buckets = [ [] for i in xrange(size) ]
+		for entry in entries:       # entries are sorted, so the buckets are too
+			self.buckets[int(entry[0] / self.width) % size].append(entry)
+		self.current = int(entries[0][0] / self.width) if len(entries) > 0 else 0
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+
+from collections import namedtuple
+
+class Message(namedtuple("Message", ["sender", "subject", "data"])):
+	"""Message broadcast by a node
+	A message is created once by its sender and shared by all its recipients, it is immutable
+	sender      -- name of the sending node
+	subject     -- string identifying the type of message
+	data        -- tuple of values (numbers or node names), whose meaning depends on the subject
+	"""
+	__slots__ = ()
+
+	def __str__(self):
+		"""Encodes the message as a string, for logging: "sender subject data..." """
+		return " ".join([self.sender, self.subject] + [ str(e) for e in self.data ])
+
+	@staticmethod
+	def parse(string):
+		"""Decodes a message encoded with str()
+		string      -- encoded message
+		Returns the message, with the data converted to integers or floats when possible
+		"""
+		words = string.split()
+		data = []
+		for word in words[2:]:
+			for convert in (int, float, str):
+				try:
+					data.append(convert(word))
+					break
+				except ValueError:
+					pass
+		return Message(words[0], words[1], tuple(data))
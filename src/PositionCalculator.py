@@ -3,18 +3,32 @@
 from math import sqrt
 import numpy as np
 
-from parameters import *
+from parameters import Config
+
+# status codes of the batch calculations (see calculateBatch), and the error messages of getPosition they stand for
+OK = 0
+NOT_SOLVED = 1
+NO_RESULT = 2
+MULTIPLE_RESULTS = 3
+ITERATION_MAXIMUM = 4
+STATUS_MESSAGES = ["ok", "could not be solved", "no result", "multiple results", "reached iteration maximum"]
 
 class PositionCalculator:
 	"""Generic class handling the data-gathering side of the position calculation
 	The calculation itself, specific to the method used, is left to child classes
 	"""
-	def __init__(self):
+	def __init__(self, config = None):
 		"""Creates a new calculator with empty data set
+		config      -- parameters of the simulation (default: the global parameters, see parameters.Config)
 		"""
+		self.config = config if config is not None else Config()
 		self.anchors = []       # list of anchor names
 		self.positions = {}     # associates to each anchor its position (array of three numbers)
-		self.data = []          # list of data samples, each associating to each anchor a data point
+		self.data = []          # list of data samples not accumulated yet, each associating to each anchor a data point
+		self.first = 0          # number of the first sample of self.data, the samples before it have been accumulated
+		self.dropped = 0        # number of data points ignored because their sample had already been accumulated
+		self.accumulated = RunningSums()        # sums of the compiled terms of the samples accumulated
+		self.accumulatedComplete = RunningSums()    # same, for the complete samples only
 		
 		# parameters to be set by the child classes
 		self.anchorMin = 1      # minimum number of anchors required for the calculation
@@ -34,49 +48,98 @@ class PositionCalculator:
 	
 	def addDataPoint(self, anchor, n, data):
 		"""Adds data to the data set
+		When the number of samples kept exceeds CALC_WINDOW, the oldest ones are compiled and accumulated in running sums
 		anchor      -- name of the anchor from which the data comes (the anchor must have already been added)
 		n           -- integer identifying the data sample
 		data        -- new data point (iterable of numbers with consistent length)
+		            data points of samples already accumulated are ignored, and counted in self.dropped
 		"""
+		if n < self.first:
+			self.dropped += 1
+			return
 		# extend the data set if needed
-		while len(self.data) <= n:
+		while len(self.data) <= n - self.first:
 			self.data.append({})
 		# add the data point, converted to a numpy array for ease of manipulation
-		self.data[n][anchor] = np.array(data)
+		self.data[n - self.first][anchor] = np.array(data)
+		# accumulate the oldest samples, once the anchors they are compiled with are known
+		window = self.config.CALC_WINDOW
+		while window > 0 and len(self.data) > window and len(self.anchors) >= self.anchorMin:
+			self.accumulate(self.data.pop(0), self.accumulated, self.accumulatedComplete)
+			self.first += 1
+	
+	def accumulate(self, sample, sums, completeSums):
+		"""Compiles a data sample and adds its terms to running sums
+		sample      -- dictionary {anchor: data point}
+		sums        -- running sums of all the samples (see RunningSums)
+		completeSums    -- running sums of the complete samples, only updated if the sample is complete
+		"""
+		comp = self.compile(sample)
+		sums.add(comp)
+		if None not in comp:
+			completeSums.add(comp)
 	
 	def getPosition(self, completeOnly=False):
 		"""Compiles the data stored and calculates a position estimate
 		completeOnly    -- only consider complete data sample
 		Returns an error message ("ok" if successful) and the estimated position as a numpy array
 		"""
-		if len(self.anchors) < self.anchorMin:
-			return "not enough anchors", np.zeros(3)
-		
-		if len(self.data) == 0:
-			return "no data", np.zeros(3)
+		msg, compiledData = self.getCompiled(completeOnly)
+		if msg != "ok":
+			return msg, np.zeros(3)
 		
-		N = len(self.compile(self.data[0])) # get the length of a compiled data sample
+		# make the calculation
+		return self.calculate(compiledData)
+	
+	def getSums(self, completeOnly=False):
+		"""Compiles the samples not accumulated yet, and adds them to the running sums of the samples accumulated
+		The samples are added in order, so the sums do not depend on when the samples were accumulated
+		completeOnly    -- only consider complete data sample
+		Returns an error message ("ok" if successful) and the running sums (see RunningSums, None if not successful)
+		"""
+		if len(self.anchors) < self.anchorMin:
+			return "not enough anchors", None
 		
-		compiledData = [ [] for i in xrange(N) ]
+		if self.first + len(self.data) == 0:
+			return "no data", None
 		
-		# unpack and compile each sample
+		sums = self.accumulated.copy()
+		completeSums = self.accumulatedComplete.copy()
 		for sample in self.data:
-			comp = self.compile(sample)
-			if None in comp and completeOnly:
-				continue
-			else:
-				for i in xrange(N):
-					if comp[i] is not None:
-						compiledData[i].append(comp[i])
+			self.accumulate(sample, sums, completeSums)
+		N = len(sums.count)     # number of terms of a compiled data sample
+		if completeOnly:
+			sums = completeSums
 		
-		if 0 in [ len(l) for l in compiledData ]:
-			return "incomplete data", np.zeros(3)
+		if len(sums.count) < N or 0 in sums.count:
+			return "incomplete data", None
+		return "ok", sums
+	
+	def getCompiled(self, completeOnly=False):
+		"""Compiles the data stored, averaging the compiled samples
+		completeOnly    -- only consider complete data sample
+		Returns an error message ("ok" if successful) and the compiled data as a numpy array (None if not successful)
+		"""
+		msg, sums = self.getSums(completeOnly)
+		if msg != "ok":
+			return msg, None
 		
 		# average the compiled data
-		compiledData = np.array([ sum(l) / len(l) for l in compiledData ])
-		
-		# make the calculation
-		return self.calculate(compiledData)
+		return "ok", sums.mean()
+	
+	def getVariances(self, completeOnly=False):
+		"""Compiles the data stored, and calculates the variance of each term of the compiled samples
+		completeOnly    -- only consider complete data sample
+		Returns an error message ("ok" if successful) and the variances as a numpy array (None if not successful)
+		"""
+		msg, sums = self.getSums(completeOnly)
+		if msg != "ok":
+			return msg, None
+		return "ok", sums.variance()
+	
+	def anchorPositions(self):
+		"""Returns the positions of the anchors, in the order they were added, as an array with one row per anchor"""
+		return np.array([ self.positions[a] for a in self.anchors ], dtype=float)
 	
 	def compile(self, sample):
 		"""Compiles a data sample into a form usable by the calculation function
@@ -94,14 +157,78 @@ class PositionCalculator:
 		"""
 		return "not implemented", np.zeros(3)
 	
+	@staticmethod
+	def calculateBatch(anchors, data, config, priors = None):
+		"""Calculates position estimates for several nodes at once, from their compiled data
+		Must be implemented by the child classes
+		anchors     -- positions of the anchors of each node, array of shape (B, number of anchors, 3)
+		data        -- compiled data of each node, array of shape (B, length of a compiled data sample)
+		config      -- parameters of the simulation
+		priors      -- prior position estimate of each node, array of shape (B, 3), used by the iterative methods
+		            (None: they start from the centroid of the anchors of each node)
+		Returns the status code of each calculation (see STATUS_MESSAGES) and the estimated positions, arrays of shape (B,) and (B, 3)
+		"""
+		B = len(data)
+		return np.full(B, NOT_SOLVED, dtype=int), np.zeros((B, 3))
+
+
+class RunningSums:
+	"""Running sums of the terms of compiled data samples, from which their averages and variances are derived
+	The variances are updated with Welford's method, which does not lose precision when the terms are large
+	compared to their spread (e.g. dates of arrival)
+	"""
+	def __init__(self):
+		"""Creates empty sums"""
+		self.count = np.zeros(0, dtype=int)     # number of values of each term
+		self.sum = np.zeros(0)                  # sum of the values of each term
+		self.running = np.zeros(0)              # running average of the values of each term
+		self.deviations = np.zeros(0)           # sum of the squared deviations of the values of each term from their average
+	
+	def add(self, comp):
+		"""Adds a compiled data sample
+		comp        -- array of either numbers, or None when a term could not be calculated
+		"""
+		N = len(comp)
+		if N > len(self.count):
+			# more terms than the previous samples (e.g. anchors added since)
+			self.count = np.append(self.count, np.zeros(N - len(self.count), dtype=int))
+			self.sum = np.append(self.sum, np.zeros(N - len(self.sum)))
+			self.running = np.append(self.running, np.zeros(N - len(self.running)))
+			self.deviations = np.append(self.deviations, np.zeros(N - len(self.deviations)))
+		for i, value in enumerate(comp):
+			if value is not None:
+				self.count[i] += 1
+				self.sum[i] += value
+				delta = value - self.running[i]
+				self.running[i] += delta / self.count[i]
+				self.deviations[i] += delta * (value - self.running[i])
+	
+	def copy(self):
+		"""Returns an independent copy of the sums"""
+		sums = RunningSums()
+		sums.count = self.count.copy()
+		sums.sum = self.sum.copy()
+		sums.running = self.running.copy()
+		sums.deviations = self.deviations.copy()
+		return sums
+	
+	def mean(self):
+		"""Returns the average of each term, from the sum of its values"""
+		return self.sum / self.count
+	
+	def variance(self):
+		"""Returns the variance of each term, from the sum of the squared deviations of its values"""
+		return self.deviations / self.count
+	
 
 class UPSCalculator(PositionCalculator):
 	"""Position calculation for the UPS process
 	"""
-	def __init__(self):
+	def __init__(self, config = None):
 		"""Creates a new calculator with empty data set
+		config      -- parameters of the simulation (default: the global parameters, see parameters.Config)
 		"""
-		PositionCalculator.__init__(self)
+		PositionCalculator.__init__(self, config)
 		self.anchorMin = 4
 		self.anchorMax = 4
 	
@@ -117,7 +244,7 @@ class UPSCalculator(PositionCalculator):
 			for i in xrange(3):
 				if self.anchors[i+1] in sample:
 					t, dt = sample[self.anchors[i+1]]
-					distDiff[i] = (t0 - dt0 - t + dt) * SND_SPEED
+					distDiff[i] = (t0 - dt0 - t + dt) * self.config.SND_SPEED
 		return distDiff
 	
 	def calculate(self, data):
@@ -126,59 +253,77 @@ class UPSCalculator(PositionCalculator):
 		data        -- compiled data
 		Returns an error message ("ok" if successful) and the estimated position as a numpy array
 		"""
-		K = data
-		P = [ self.positions[a] for a in self.anchors ]
+		status, positions = self.calculateBatch(self.anchorPositions()[None], np.array(data)[None], self.config)
+		return STATUS_MESSAGES[status[0]], positions[0]
+	
+	@staticmethod
+	def calculateBatch(anchors, data, config, priors = None):
+		"""Calculates position estimates for several nodes at once, from their compiled data (see PositionCalculator.calculateBatch)
+		The position is found in closed form, as the intersection of three hyperboloids
+		anchors     -- positions of the 4 anchors of each node, array of shape (B, 4, 3)
+		data        -- distance differences between the first anchor and the others, array of shape (B, 3)
+		config      -- parameters of the simulation
+		priors      -- not used
+		Returns the status code of each calculation (see STATUS_MESSAGES) and the estimated positions, arrays of shape (B,) and (B, 3)
+		"""
+		K = np.asarray(data, dtype=float)
+		P = np.asarray(anchors, dtype=float)
+		B = len(K)
+		P0 = P[:,0]
+		squares = np.einsum('bij,bij->bi', P, P)
 		# solving linear equations
-		M = 2 * (P[0] - np.stack((P[1], P[2], P[3])))
+		M = 2 * (P0[:,None,:] - P[:,1:4])
 		I = -2 * K
-		J = K*K + P[0].dot(P[0]) - np.array([ P[i].dot(P[i]) for i in xrange(1,4) ])
+		J = K*K + squares[:,:1] - squares[:,1:4]
+		solvable = np.ones(B, dtype=bool)
 		try:
-			A = np.linalg.inv(M).dot(I)
-			B = np.linalg.inv(M).dot(J)
-		except np.linalg.linalg.LinAlgError:
-			print M
-			return "could not be solved", np.zeros(3)
+			Minv = np.linalg.inv(M)
+		except np.linalg.LinAlgError:
+			# some systems are singular: invert the others one by one
+			Minv = np.zeros((B, 3, 3))
+			for b in xrange(B):
+				try:
+					Minv[b] = np.linalg.inv(M[b])
+				except np.linalg.LinAlgError:
+					solvable[b] = False
+		A = np.einsum('bij,bj->bi', Minv, I)
+		C = np.einsum('bij,bj->bi', Minv, J)
 		# solving quadratic equation
-		alpha = A.dot(A) - 1
-		beta = 2*A.dot(B) - 2*A.dot(P[0])
-		gamma = B.dot(B) - 2*B.dot(P[0]) + P[0].dot(P[0])
+		alpha = np.einsum('bi,bi->b', A, A) - 1
+		beta = 2*np.einsum('bi,bi->b', A, C) - 2*np.einsum('bi,bi->b', A, P0)
+		gamma = np.einsum('bi,bi->b', C, C) - 2*np.einsum('bi,bi->b', C, P0) + squares[:,0]
 		delta = beta*beta - 4*alpha*gamma
-		# calculating root(s)
-		if delta < 0:
-			roots = []
-		if delta == 0:
-			roots = [ -beta / (2*alpha) ]
-		if delta > 0:
-			roots = [ (-beta - sqrt(delta)) / (2*alpha),
-			          (-beta + sqrt(delta)) / (2*alpha) ]
-		# selecting valid results
-		positions = []
-		for r in roots:
-			# eliminate negative solutions
-			if r < 0:
-				continue
-			# calculate the positon
-			pos = A*r + B
-			# check it's at a valid distance from each anchor
-			if max([ np.linalg.norm(pos-a) for a in P ]) <= SIM_RANGE * 1.1:
-				positions.append(pos)
-		# return the result
-		if len(positions) == 0:
-			return "no result", np.zeros(3)
-		elif len(positions) == 1:
-			return "ok", positions[0]
-		else:
-			return "multiple results", np.zeros(3)
-		
+		status = np.full(B, NO_RESULT, dtype=int)
+		positions = np.zeros((B, 3))
+		found = np.zeros(B, dtype=int)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			root = np.sqrt(np.maximum(delta, 0))
+			# calculating root(s): a double root when delta is null, none when it is negative
+			for r, exists in (((-beta - root) / (2*alpha), delta >= 0), ((-beta + root) / (2*alpha), delta > 0)):
+				# calculate the positions, eliminating negative solutions
+				pos = A*r[:,None] + C
+				# check they are at a valid distance from each anchor
+				V = pos[:,None,:] - P
+				farthest = np.sqrt(np.einsum('bij,bij->bi', V, V)).max(axis=1)
+				valid = solvable & exists & (r >= 0) & (farthest <= config.SIM_RANGE * 1.1)
+				positions[valid & (found == 0)] = pos[valid & (found == 0)]
+				found += valid
+		status[found == 1] = OK
+		status[found > 1] = MULTIPLE_RESULTS
+		status[~solvable] = NOT_SOLVED
+		positions[status != OK] = 0
+		return status, positions
+
 
 class TOACalculator(PositionCalculator):
 	"""Position calculation based on the time of arrival
 	"""
-	def __init__(self, position):
+	def __init__(self, position, config = None):
 		"""Creates a new calculator with empty data set
 		position    -- prior position estimate
+		config      -- parameters of the simulation (default: the global parameters, see parameters.Config)
 		"""
-		PositionCalculator.__init__(self)
+		PositionCalculator.__init__(self, config)
 		self.anchorMin = 3
 		self.anchorMax = -1
 		self.priorPosition = np.array(position)
@@ -194,7 +339,7 @@ class TOACalculator(PositionCalculator):
 		for i, a in enumerate(self.anchors):
 			if a in sample:
 				tof, dt = sample[a]
-				distances[i] = SND_SPEED * (tof - dt) / 2
+				distances[i] = self.config.SND_SPEED * (tof - dt) / 2
 		return distances
 	
 	def calculate(self, data):
@@ -203,41 +348,41 @@ class TOACalculator(PositionCalculator):
 		data        -- compiled data
 		Returns an error message ("ok" if successful) and the estimated position as a numpy array
 		"""
-		X = self.priorPosition[:]
-		N = len(data)
-		
-		for k in xrange(TOA_ITERMAX):
-			R = np.zeros(N)     # residuals matrix
-			J = np.zeros((N,3)) # Jacobian matrix
-			
-			for i, a in enumerate(self.anchors):
-				dist = np.linalg.norm(self.positions[a] - X)
-				R[i] = data[i] - dist
-				J[i] = (self.positions[a] - X) / dist
-			
-			try:
-				diff = np.linalg.inv(J.T.dot(J)).dot(J.T).dot(R)    # differential of the Gauss-Newton method
-			except np.linalg.linalg.LinAlgError:
-				print k, J, J.T.dot(J)
-				return "could not be solved", np.zeros(3)
-			var = np.linalg.norm(diff)
-			X = X - diff
-			
-			if var < TOA_THRESHOLD:
-				return "ok", X
-		
-		return "reached iteration maximum", X
+		status, positions = self.calculateBatch(self.anchorPositions()[None], np.array(data)[None], self.config,
+		                                        self.priorPosition[None])
+		return STATUS_MESSAGES[status[0]], positions[0]
+	
+	@staticmethod
+	def calculateBatch(anchors, data, config, priors = None):
+		"""Calculates position estimates for several nodes at once, from their compiled data (see PositionCalculator.calculateBatch)
+		Each node iterates the Gauss-Newton method until its own convergence
+		anchors     -- positions of the N anchors of each node, array of shape (B, N, 3)
+		data        -- distances between each node and its anchors, array of shape (B, N)
+		config      -- parameters of the simulation
+		priors      -- prior position estimate of each node, array of shape (B, 3), None for the centroid of its anchors
+		Returns the status code of each calculation (see STATUS_MESSAGES) and the estimated positions, arrays of shape (B,) and (B, 3)
+		"""
+		P = np.asarray(anchors, dtype=float)
+		D = np.asarray(data, dtype=float)
+		if priors is None:
+			priors = P.mean(axis=1)
+		def linearize(X, active):
+			V = P[active] - X[:,None,:]
+			dist = np.sqrt(np.einsum('bij,bij->bi', V, V))
+			return D[active] - dist, V / dist[...,None]             # residuals, Jacobian matrices
+		return gaussNewton(linearize, priors, config)
 
 class TDOACalculator(PositionCalculator):
 	"""Position calculation based on time difference of arrival, by listening in on call-and-reply ToA
 	Uses a least-squares method with unlimited anchors
 	Data: (time of arrival, reply delay) 
 	"""
-	def __init__(self, position):
+	def __init__(self, position, config = None):
 		"""Creates a new calculator with empty data set
 		position    -- prior position estimate
+		config      -- parameters of the simulation (default: the global parameters, see parameters.Config)
 		"""
-		PositionCalculator.__init__(self)
+		PositionCalculator.__init__(self, config)
 		self.anchorMin = 4
 		self.anchorMax = -1
 		self.priorPosition = np.array(position)
@@ -251,11 +396,11 @@ class TDOACalculator(PositionCalculator):
 		N = len(self.anchors)
 		deltaDist = [ None for i in xrange(N-1) ]
 		master = self.anchors[-1]   # last anchor, that made the call
-		
+	
 		if master not in sample:
 			# the master is not present, nothing can be done
 			return deltaDist
-		
+	
 		t0, dt0 = sample[master]
 		p0 = self.positions[master]
 		for i in xrange(N-1):
@@ -263,8 +408,8 @@ class TDOACalculator(PositionCalculator):
 			if anchor in sample:
 				t, dt = sample[anchor]
 				p = self.positions[anchor]
-				deltaDist[i] = np.linalg.norm(p0 - p) + (t0 - dt0 - t + dt) * SND_SPEED
-		
+				deltaDist[i] = np.linalg.norm(p0 - p) + (t0 - dt0 - t + dt) * self.config.SND_SPEED
+	
 		return deltaDist
 	
 	def calculate(self, data):
@@ -273,34 +418,111 @@ class TDOACalculator(PositionCalculator):
 		data        -- compiled data
 		Returns an error message ("ok" if successful) and the estimated position as a numpy array
 		"""
-		X = self.priorPosition[:]
-		N = len(data)   # equal to len(anchors) - 1
-		
-		for k in xrange(TOA_ITERMAX):
-			R = np.zeros(N)     # residuals matrix
-			J = np.zeros((N,3)) # Jacobian matrix
-			
-			a0 = self.anchors[-1]
-			dist0 = np.linalg.norm(self.positions[a0] - X)
-			j0 = (self.positions[a0] - X) / dist0
-			
-			for i in xrange(N):
-				a = self.anchors[i]
-				dist = np.linalg.norm(self.positions[a] - X)
-				R[i] = data[i] - (dist0 - dist)
-				J[i] = j0 - (self.positions[a] - X) / dist
-			
-			try:
-				diff = np.linalg.inv(J.T.dot(J)).dot(J.T).dot(R)    # differential of the Gauss-Newton method
-			except np.linalg.linalg.LinAlgError:
-				print k, X
-				print J
-				print J.T.dot(J)
-				return "could not be solved", np.zeros(3)
-			var = np.linalg.norm(diff)
-			X = X - diff
-			
-			if var < TOA_THRESHOLD:
-				return "ok", X
-		
-		return "reached iteration maximum", X
\ No newline at end of file
+		status, positions = self.calculateBatch(self.anchorPositions()[None], np.array(data)[None], self.config,
+		                                        self.priorPosition[None])
+		return STATUS_MESSAGES[status[0]], positions[0]
+	
+	@staticmethod
+	def calculateBatch(anchors, data, config, priors = None):
+		"""Calculates position estimates for several nodes at once, from their compiled data (see PositionCalculator.calculateBatch)
+		Each node iterates the Gauss-Newton method until its own convergence
+		anchors     -- positions of the N anchors of each node, the last one being the master, array of shape (B, N, 3)
+		data        -- differences between the distances to the master and to the other anchors, array of shape (B, N-1)
+		config      -- parameters of the simulation
+		priors      -- prior position estimate of each node, array of shape (B, 3), None for the centroid of its anchors
+		Returns the status code of each calculation (see STATUS_MESSAGES) and the estimated positions, arrays of shape (B,) and (B, 3)
+		"""
+		P = np.asarray(anchors, dtype=float)
+		D = np.asarray(data, dtype=float)
+		if priors is None:
+			priors = P.mean(axis=1)
+		def linearize(X, active):
+			V0 = P[active,-1] - X
+			dist0 = np.sqrt(np.einsum('bi,bi->b', V0, V0))
+			V = P[active,:-1] - X[:,None,:]
+			dist = np.sqrt(np.einsum('bij,bij->bi', V, V))
+			R = D[active] - (dist0[:,None] - dist)                   # residuals
+			J = (V0 / dist0[:,None])[:,None,:] - V / dist[...,None]  # Jacobian matrices
+			return R, J
+		return gaussNewton(linearize, priors, config)
+
+def gaussNewton(linearize, priors, config):
+	"""Iterates the Gauss-Newton method for several nodes at once, each until its own convergence
+	linearize   -- function giving the residuals and the Jacobian matrices of the nodes still iterating, arrays of shape (b, n)
+	            and (b, n, 3), from their current positions (array of shape (b, 3)) and their indices
+	priors      -- prior position estimate of each node, array of shape (B, 3)
+	config      -- parameters of the simulation, TOA_ITERMAX, TOA_THRESHOLD and TOA_RCOND are used
+	Returns the status code of each calculation (see STATUS_MESSAGES) and the estimated positions, arrays of shape (B,) and (B, 3)
+	"""
+	X = np.array(priors, dtype=float)
+	B = len(X)
+	status = np.full(B, ITERATION_MAXIMUM, dtype=int)
+	active = np.arange(B)           # nodes still iterating
+	for k in xrange(config.TOA_ITERMAX):
+		if len(active) == 0:
+			break
+		everyone = len(active) == B     # the whole arrays are used rather than copies, as long as no node has stopped
+		R, J = linearize(X, slice(None)) if everyone else linearize(X[active], active)
+		diff, solvable = gaussNewtonStep(J, R, config.TOA_RCOND)
+		if not solvable.all():
+			status[active[~solvable]] = NOT_SOLVED
+			X[active[~solvable]] = 0
+			active = active[solvable]
+			diff = diff[solvable]
+			everyone = False
+		if everyone:
+			X -= diff
+		else:
+			X[active] -= diff
+		converged = np.sqrt(np.einsum('bi,bi->b', diff, diff)) < config.TOA_THRESHOLD
+		if converged.any():
+			status[active[converged]] = OK
+			active = active[~converged]
+	return status, X
+
+def gaussNewtonStep(J, R, rcond):
+	"""Calculates the differentials of the Gauss-Newton method, the least-squares solutions of J.diff = R for a stack of systems
+	The systems are solved by singular value decomposition, without forming the normal matrices J.T.J, whose conditioning
+	is the square of that of J
+	J           -- Jacobian matrices, one row per residual, array of shape (B, n, 3)
+	R           -- residuals, array of shape (B, n)
+	rcond       -- singular values of J below rcond times the largest are considered null
+	Returns the differentials, and whether each J is defined (node not on an anchor) and has rank 3 (anchors not coplanar with
+	the node), arrays of shape (B, 3) and (B,)
+	a differential is meaningless if its J is not defined or does not have rank 3
+	"""
+	if J.shape[1] < 3:
+		return np.zeros((len(J), 3)), np.zeros(len(J), dtype=bool)
+	bad = ~np.isfinite(J).all(axis=(1, 2))     # not a number in the matrix (node on an anchor): it cannot be solved
+	if bad.any():
+		J = np.where(bad[:,None,None], 0, J)    # null matrices, for the decomposition of the others to succeed
+	U, s, Vt = np.linalg.svd(J, full_matrices=False)
+	solvable = (s[:,-1] > rcond * s[:,0]) & ~bad
+	x = np.einsum('bij,bi->bj', U, R) / (s + (s == 0))     # null singular values only occur in matrices that cannot be solved
+	return np.einsum('bij,bi->bj', Vt, x), solvable
+
+def getPositions(calculators, completeOnly=False):
+	"""Calculates the position estimates of several calculators at once, with the same results as their getPosition method
+	The calculators are grouped by class, number of anchors and parameters, and each group is calculated in a single batch
+	(see calculateBatch), e.g. all the sensors localized by the same UPS beacon series
+	calculators -- list of calculators, possibly of different classes
+	completeOnly    -- only consider complete data sample
+	Returns the list of the error messages ("ok" if successful) and estimated positions of the calculators
+	"""
+	results = [ None for c in calculators ]
+	groups = {}
+	for i, calculator in enumerate(calculators):
+		msg, compiledData = calculator.getCompiled(completeOnly)
+		if msg != "ok":
+			results[i] = (msg, np.zeros(3))
+		else:
+			key = (calculator.__class__, len(calculator.anchors), id(calculator.config))
+			groups.setdefault(key, []).append((i, calculator, compiledData))
+	for (calculatorClass, N, c), members in groups.iteritems():
+		anchors = np.array([ calculator.anchorPositions() for i, calculator, compiledData in members ])
+		data = np.array([ compiledData for i, calculator, compiledData in members ])
+		priors = np.array([ getattr(calculator, "priorPosition", np.zeros(3)) for i, calculator, compiledData in members ], dtype=float)
+		status, positions = calculatorClass.calculateBatch(anchors, data, members[0][1].config, priors)
+		for (i, calculator, compiledData), s, position in zip(members, status, positions):
+			results[i] = (STATUS_MESSAGES[s], position)
+	return results
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import SimEnvironment
+from PositionCalculator import UPSCalculator, TOACalculator, TDOACalculator
+
+from timeit import default_timer as clock
+import types
+
+# methods of the simulation environment measured, as engine stages
+ENGINE_METHODS = [ "processTick", "processEvent", "broadcast", "schedule", "updateSpeed", "speedsOfSound", "nextTickTime",
+                   "wakeUp", "buildNeighborTable" ]
+# methods of the event queue measured
+QUEUE_METHODS = [ "push", "pop", "peek" ]
+# functions of the SimEnvironment module measured (operations on the heap of wake-ups)
+MODULE_FUNCTIONS = [ "heappush", "heappop" ]
+# calculators, and their methods measured
+CALCULATORS = [ UPSCalculator, TOACalculator, TDOACalculator ]
+CALCULATOR_METHODS = [ "addAnchor", "addDataPoint", "getPosition", "compile", "calculate" ]
+# methods of the nodes that are not measured
+IGNORED_METHODS = [ "display" ]
+
+class Profiler:
+	"""Measures the time spent in the engine and in the nodes during a simulation
+	The methods measured are replaced by timing wrappers when the profiler is attached, and restored when it is detached,
+	so that the simulation is not slowed down when it is not profiled
+	"""
+	def __init__(self):
+		"""Creates a profiler with empty measurements"""
+		self.stats = {}         # associates to each label [number of calls, total time (s), own time (s)]
+		                        # the own time excludes the time spent in the other methods measured
+		self.stack = []         # time spent in the methods measured called by each method being executed (s)
+		self.wrapped = []       # replaced attributes (owner, name, original value or None if it was inherited)
+		self.start = 0          # date of the attachment (s)
+		self.duration = 0       # total time spent attached (s)
+	
+	def attach(self, sim):
+		"""Starts measuring a simulation
+		The node classes measured are those of the nodes of the simulation, all their methods are measured
+		sim         -- simulation environment
+		"""
+		for name in ENGINE_METHODS:
+			self.wrap(sim, name, "engine: " + name)
+		for name in QUEUE_METHODS:
+			self.wrap(sim.events, name, "engine: queue " + name)
+		for name in MODULE_FUNCTIONS:
+			self.wrap(SimEnvironment, name, "engine: wake-ups " + name)
+		classes = []
+		for node in sim.nodes:
+			if node.__class__ not in classes:
+				classes.append(node.__class__)
+		for nodeClass in classes:
+			for name in dir(nodeClass):
+				if not name.startswith("_") and name not in IGNORED_METHODS and callable(getattr(nodeClass, name)):
+					self.wrap(nodeClass, name, nodeClass.__name__ + "." + name)
+		for calculatorClass in CALCULATORS:
+			for name in CALCULATOR_METHODS:
+				self.wrap(calculatorClass, name, calculatorClass.__name__ + "." + name)
+		self.start = clock()
+	
+	def detach(self):
+		"""Stops measuring, and restores the methods measured"""
+		self.duration += clock() - self.start
+		for owner, name, original in reversed(self.wrapped):
+			if original is None:
+				delattr(owner, name)
+			else:
+				setattr(owner, name, original)
+		self.wrapped = []
+	
+	def wrap(self, owner, name, label):
+		"""Replaces a method by a timing wrapper
+		owner       -- class, instance or module holding the method
+		name        -- name of the method
+		label       -- name of the measurement
+		"""
+		original = owner.__dict__.get(name)
+		function = getattr(owner, name)
+		if isinstance(owner, (type, types.ClassType)):
+			function = getattr(function, "im_func", function)     # the wrapper is bound in place of the function
+		stats = self.stats.setdefault(label, [0, 0., 0.])
+		stack = self.stack
+		def wrapper(*args, **kwargs):
+			stack.append(0.)
+			start = clock()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				elapsed = clock() - start
+				stats[0] += 1
+				stats[1] += elapsed
+				stats[2] += elapsed - stack.pop()
+				if len(stack) > 0:
+					stack[-1] += elapsed
+		self.wrapped.append((owner, name, original))
+		setattr(owner, name, wrapper)
+	
+	def report(self):
+		"""Prints the measurements, by decreasing own time"""
+		print "profile: %.3f s" % self.duration
+		print "{:44} {:>10} {:>10} {:>10} {:>10} {:>6}".format("", "calls", "total (s)", "own (s)", "own/call", "own %")
+		measured = 0
+		for label, (calls, total, own) in sorted(self.stats.items(), key = lambda item: -item[1][2]):
+			if calls == 0:
+				continue
+			measured += own
+			print "{:44} {:>10} {:>10.3f} {:>10.3f} {:>8.1f}us {:>6.1f}".format(label, calls, total, own, 1e6 * own / calls,
+			                                                                   100 * own / max(self.duration, 1e-9))
+		print "{:44} {:>10} {:>10} {:>10.3f} {:>10} {:>6.1f}".format("run loop and profiler", "", "", self.duration - measured, "",
+		                                                         100 * (self.duration - measured) / max(self.duration, 1e-9))
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+from parameters import Config
+from SimEnvironment import SimEnvironment, distance
+from ups import MasterAnchorNode, AnchorNode, SensorNode
+
+from random import uniform
+import numpy as np
+import random
+import sys
+import os
+import time as clock
+
+class Scenario:
+	"""Generic class describing a simulation to be run several times (topology, node class, duration)
+	A scenario only holds its description, so that it can be sent to other processes
+	"""
+	def __init__(self, duration, config = None):
+		"""Create a scenario
+		duration    -- duration of each simulation (s)
+		config      -- parameters of the simulations (default: the global parameters, see parameters.Config)
+		"""
+		self.duration = duration
+		self.config = config if config is not None else Config()
+		self.engine = SimEnvironment    # class of the simulation environment, can be replaced by any compatible engine
+		self.until = None               # termination conditions of the simulations, see SimEnvironment.run
+		self.quiet = None
+	
+	def build(self):
+		"""Creates the simulation environment and its nodes, using the current random state
+		Returns the simulation environment, and the indices of the nodes whose localization is evaluated
+		"""
+		return self.engine((1, 1, 1), config = self.config), []
+	
+	def run(self, seed, trace = None):
+		"""Runs one simulation of the scenario
+		The outputs of the nodes are silenced
+		seed        -- random seed, determining both the deployment and the course of the simulation
+		trace       -- TraceRecorder recording the messages of the simulation (see Trace), it is not closed
+		Returns a dictionary holding:
+		    seed            -- random seed of the simulation
+		    duration        -- date of the last transmission (s)
+		    convergence     -- date at which the termination condition was met (s), None if it was not (see SimEnvironment.run)
+		    transmissions   -- number of messages broadcast for each subject
+		    estimates       -- position estimate of each node (see UWNode.estimate), None if the node is not localized
+		    errors          -- localization error of each evaluated node (m), nan if the node is not localized
+		    events          -- number of events processed: ticks of the nodes and receptions of messages
+		    peakQueue       -- largest number of broadcasts propagating at the same time
+		    wall            -- time taken by the simulation (s)
+		"""
+		random.seed(seed)
+		np.random.seed(seed)
+		sim, evaluated = self.build()
+		stdout = sys.stdout
+		sys.stdout = open(os.devnull, 'w')
+		try:
+			start = clock.time()
+			convergence = sim.run(self.duration, trace = trace, until = self.until, quiet = self.quiet)
+			wall = clock.time() - start
+		finally:
+			sys.stdout.close()
+			sys.stdout = stdout
+		statistics = sim.statistics()
+		estimates = [ node.estimate() for node in sim.nodes ]
+		errors = []
+		for i in evaluated:
+			estimate = estimates[i]
+			errors.append(distance(sim.nodes[i].position, estimate) if estimate is not None else float('nan'))
+		return { "seed":           seed
+		       , "duration":       statistics["end"]
+		       , "convergence":    convergence
+		       , "transmissions":  dict( (s, counts["transmissions"]) for s, counts in statistics["subjects"].iteritems() )
+		       , "estimates":      [ tuple(float(x) for x in e) if e is not None else None for e in estimates ]
+		       , "errors":         errors
+		       , "events":         sim.ticksProcessed + statistics["total"]["receptions"]
+		       , "peakQueue":      sim.peakQueue
+		       , "wall":           wall
+		       }
+
+class GridScenario(Scenario):
+	"""Deployment of the tests of test.py: a jittered grid of nodes at a constant depth around a few initial anchors
+	All the nodes are of the same class, created with (id, position, localized)
+	"""
+	layout = [ (-1, -1, 0), (1, -1, 0), (0, 1, 0), (0, 1, -300) ]     # initial anchors of test.py, X and Y in units of L from the center
+	
+	def __init__(self, nodeClass, R, L = 400., anchors = 4, layout = None, jitter = 50., initialGuess = False, master = False, duration = 20000., config = None):
+		"""Create a grid scenario
+		nodeClass   -- class of the nodes
+		R           -- number of nodes on each side of the grid
+		L           -- distance between two nodes of the grid (m)
+		anchors     -- number of initial anchors, placed around the center of the grid
+		layout      -- positions of the initial anchors: X and Y in units of L from the center, Z (m) (default: as in test.py)
+		jitter      -- standard deviation of the distance between a node and its place on the grid (m)
+		initialGuess-- if set to True, the nodes use their place on the grid as starting point for ToA (required by LST)
+		master      -- if set to True, the first anchor is made master anchor with makeMaster() (required by LSLS)
+		duration    -- duration of each simulation (s)
+		config      -- parameters of the simulations (default: the global parameters, see parameters.Config)
+		"""
+		Scenario.__init__(self, duration, config)
+		self.nodeClass = nodeClass
+		self.R = R
+		self.L = L
+		self.anchors = anchors
+		self.layout = layout if layout is not None else GridScenario.layout
+		self.jitter = jitter
+		self.initialGuess = initialGuess
+		self.master = master
+	
+	def build(self):
+		"""Creates the simulation environment and its nodes, using the current random state
+		Returns the simulation environment, and the indices of the grid nodes
+		"""
+		D = self.R * self.L
+		L = self.L
+		if hasattr(self.nodeClass, "slotNumber"):
+			self.nodeClass.slotNumber = 0       # the number of time slots only grows as nodes are created
+		sim = self.engine((D, D, 500), config = self.config)
+		for n, (x, y, z) in enumerate(self.layout[:self.anchors]):
+			node = self.nodeClass(n, (D/2 + x*L, D/2 + y*L, z), True)
+			if self.master and n == 0:
+				node.makeMaster()
+			sim.addNode(node)
+		n = len(sim.nodes)
+		for i in xrange(self.R):
+			for j in xrange(self.R):
+				idealPosition = np.array([(0.5 + i) * L, (0.5 + j) * L, -300])
+				node = self.nodeClass(n, np.random.normal(idealPosition, self.jitter), False)
+				if self.initialGuess:
+					node.positionEstimate = idealPosition
+				sim.addNode(node)
+				n += 1
+		return sim, range(self.anchors, n)
+
+class UPSScenario(Scenario):
+	"""UPS deployment: four anchors at a corner of the simulation space, and randomly placed sensors listening to them"""
+	def __init__(self, sensors, size = 600., depth = 500., duration = 100., config = None):
+		"""Create a UPS scenario
+		sensors     -- number of sensor nodes
+		size        -- side of the simulation space (m), must be small enough for all nodes to hear all anchors
+		depth       -- depth of the simulation space (m)
+		duration    -- duration of each simulation (s)
+		config      -- parameters of the simulations (default: the global parameters, see parameters.Config)
+		"""
+		Scenario.__init__(self, duration, config)
+		self.sensors = sensors
+		self.size = size
+		self.depth = depth
+	
+	def build(self):
+		"""Creates the simulation environment and its nodes, using the current random state
+		Returns the simulation environment, and the indices of the sensors
+		"""
+		S = self.size
+		sim = self.engine((S, S, self.depth), config = self.config)
+		sim.addNode(MasterAnchorNode((1, 1, -1)))
+		sim.addNode(AnchorNode(1, (S - 1, 1, -1)))
+		sim.addNode(AnchorNode(2, (1, S - 1, -1)))
+		sim.addNode(AnchorNode(3, (1, 1, 1 - self.depth)))
+		margin = S / 10
+		for i in xrange(self.sensors):
+			node = SensorNode(i)
+			node.position = (uniform(margin, S - margin), uniform(margin, S - margin), uniform(margin - self.depth, -margin))
+			sim.addNode(node)
+		return sim, range(4, len(sim.nodes))
@@ -1,36 +1,72 @@
 #!/usr/bin/env python
 
-from parameters import *
+from parameters import Config
+
+from EventQueue import HeapQueue, CalendarQueue
+from Statistics import ChannelStatistics, NodeCategories
+from UWNode import UNLOCALIZED
 
 from heapq import heappush, heappop
 from random import uniform, gauss
-from math import sqrt
+from math import sqrt, ceil
+import cPickle as pickle
+import inspect
+import random
 import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
+# parameters that cannot be changed once the simulation has started: the scheduled ticks and the counters depend on them
+FIXED_PARAMETERS = [ "SIM_TICK", "SIM_PERIOD" ]
+
 class SimEnvironment:
 	"""Manages a set of nodes and the communications between them"""
-	def __init__(self, size):
+	def __init__(self, size, queue = HeapQueue, config = None):
 		"""Initialize the simulation environment
 		size        -- dimensions (dimX, dimY, dimZ) of the simulation space
 		            the simulation space is defined by the following ranges:
 		                0 < x < dimX
 		                0 < y < dimY
 		            -dimZ < z < 0
+		queue       -- class of the event queue (HeapQueue or CalendarQueue, see EventQueue), created with the duration of a tick
+		config      -- parameters of the simulation (default: the global parameters, see parameters.Config)
 		"""
+		if config is None:
+			config = Config()
+		self.config = config
+		
 		dimX, dimY, dimZ = size
 		self.maxX = dimX
 		self.maxY = dimY
 		self.minZ = -dimZ
 		
-		self.speedMatrix = SIM_TICK * SND_VAR * np.random.randn(2,2,2)        # create a 2x2x2 array of normal (1,s) random values
+		self.speedMatrix = config.SIM_TICK * config.SND_VAR * np.random.randn(2,2,2)        # create a 2x2x2 array of normal (1,s) random values
 		
 		self.nodes = []
-		self.events = []                # managed with heapq
-		                                # events have the form (time, message, recipient)
-		                                # if the message is empty then the function tick(time) is called for all nodes
-		                                # otherwise the function receive(time, message) is called for the recipient
+		self.positions = np.zeros((16,3))  # positions of the nodes, row i corresponding to self.nodes[i]
+		                                # rows past len(self.nodes) are spare capacity
+		self.grid = {}                  # spatial index associating to each cell (i,j,k) the list of indices of the nodes it contains
+		                                # cells are cubes of side SIM_RANGE, so a node can only reach nodes in the 27 surrounding cells
+		self.neighborTable = None       # cached neighbor table (start offsets, indices, distances), see buildNeighborTable
+		                                # set to None whenever a node is added or moved
+		self.events = queue(config.SIM_TICK)    # events are wavefronts: each broadcast is a single event, dated by its next arrival
+		                                        # the function receive(time, message) is called for each recipient in turn
+		
+		self.tick = 0                   # number of the next tick to be processed, tick k happening at k * SIM_TICK
+		self.speedTicks = 0             # number of ticks the speed of sound field has been advanced for
+		                                # the field is only advanced when a propagation delay is evaluated
+		self.wakeups = []               # managed with heapq
+		                                # wake-ups have the form (tick, node), node being the index of the node to tick
+		self.nodeWakeups = []           # tick at which each node is scheduled to wake up (inf if dormant)
+		                                # wake-ups in self.wakeups that do not match this value are obsolete
+		
+		self.counters = ChannelStatistics(config.SIM_PERIOD)   # messages transmitted, received and lost, see statistics
+		self.categories = NodeCategories()  # number of nodes of each category, updated by the nodes (see UWNode.setCategory)
+		self.convergence = None         # date at which the last run met its termination condition (s), see run
+		self.trace = None               # recorder of the messages of the current run (see Trace), None if not recording
+		self.profiler = None            # profiler of the last profiled run (see Profiler)
+		self.ticksProcessed = 0         # number of times a node has been ticked
+		self.peakQueue = 0              # largest number of wavefronts in the event list
 	
 	def addNode(self, node):
 		"""Adds a node to the simulation environment
@@ -43,69 +79,374 @@ class SimEnvironment:
 			z = uniform(self.minZ, 0)
 			node.position = (x,y,z)
 		
+		n = len(self.nodes)
+		if n == len(self.positions):    # double the capacity of the position array when it is full
+			self.positions = np.concatenate((self.positions, np.zeros_like(self.positions)))
+			for other in self.nodes:
+				other.positions = self.positions
+		self.positions[n] = node.position
+		node.positions = self.positions # the node reads its position in the array from now on
+		node.index = n
+		self.grid.setdefault(self.cell(node.position), []).append(n)
 		self.nodes.append(node)
+		self.counters.addNode()
+		self.categories.add(node.category)
+		self.neighborTable = None
+		node.config = self.config       # the node and its calculators use the parameters of the simulation
+		node.categories = self.categories
+		node.sim = self                 # the positions written to the node go through moveNode from now on
+		self.nodeWakeups.append(float('inf'))
+		self.wakeUp(n, 0)               # nodes are ticked as soon as possible after being added
+	
+	def moveNode(self, node, position):
+		"""Moves a node of the simulation environment, also called when the position of a node added is written
+		node        -- node to be moved (must have been added)
+		position    -- new X,Y,Z coordinates of the node (m,m,m)
+		"""
+		i = node.index
+		assert i < len(self.nodes) and self.nodes[i] is node, "node %s not added to this environment" % node.name
+		key = self.cell(self.positions[i])
+		self.grid[key].remove(i)
+		if len(self.grid[key]) == 0:
+			del self.grid[key]          # the cells of the spatial index are never empty
+		self.positions[i] = position
+		cell = self.grid.setdefault(self.cell(position), [])
+		cell.append(i)
+		cell.sort()
+		self.neighborTable = None
+	
+	def cell(self, position):
+		"""Finds the cell of the spatial index containing a position
+		position    -- X,Y,Z coordinates (m,m,m)
+		Returns the integer coordinates (i,j,k) of the cell
+		"""
+		x, y, z = position
+		r = self.config.SIM_RANGE
+		return (int(x // r), int(y // r), int(z // r))
+	
+	def neighborhood(self, position):
+		"""Lists the nodes that may be in range of a position, using the spatial index
+		position    -- X,Y,Z coordinates (m,m,m)
+		Returns the sorted indices of the nodes in the 27 cells surrounding the position, as an integer array
+		"""
+		i, j, k = self.cell(position)
+		candidates = []
+		for di in (-1, 0, 1):
+			for dj in (-1, 0, 1):
+				for dk in (-1, 0, 1):
+					candidates.extend(self.grid.get((i+di, j+dj, k+dk), ()))
+		candidates.sort()       # keep the order in which the nodes were added
+		return np.array(candidates, dtype=int)
+	
+	def buildNeighborTable(self):
+		"""Computes the neighbors of every node, to be reused by all broadcasts as long as nodes do not move
+		The table is stored in compressed form: the neighbors of node i are neighborIndices[start[i]:start[i+1]],
+		at distances neighborDistances[start[i]:start[i+1]], sorted by index
+		"""
+		n = len(self.nodes)
+		indices = [ None for i in xrange(n) ]
+		distances = [ None for i in xrange(n) ]
+		for (i, j, k), members in self.grid.iteritems():
+			# all the members of a cell share the same candidates
+			candidates = self.neighborhood(self.positions[members[0]])
+			diff = self.positions[members][:, np.newaxis, :] - self.positions[candidates][np.newaxis, :, :]
+			d = np.sqrt(np.sum(diff**2, axis=2))
+			inRange = (d > 0) & (d <= self.config.SIM_RANGE)
+			for m, member in enumerate(members):
+				indices[member] = candidates[inRange[m]]
+				distances[member] = d[m][inRange[m]]
+		start = np.zeros(n+1, dtype=int)
+		start[1:] = np.cumsum([ len(l) for l in indices ])
+		if n > 0:
+			self.neighborTable = (start, np.concatenate(indices), np.concatenate(distances))
+		else:
+			self.neighborTable = (start, np.zeros(0, dtype=int), np.zeros(0))
+	
+	def neighbors(self, i):
+		"""Lists the nodes in range of a node, using the cached neighbor table
+		i           -- index of the node
+		Returns the indices of the neighbors and their distances to the node, as arrays
+		"""
+		if self.neighborTable is None:
+			self.buildNeighborTable()
+		start, indices, distances = self.neighborTable
+		return indices[start[i]:start[i+1]], distances[start[i]:start[i+1]]
 	
-	def run(self, timeout, verbose = False, show = 0):
+	def run(self, timeout, verbose = False, show = 0, trace = None, profile = False, until = None, quiet = None):
 		"""Runs the simulation
-		timeout     -- duration of the simulation (s)
+		Nodes are only ticked when they asked to be (see UWNode.nextTick), and ticks where no node is due are skipped
+		The simulation can be resumed by running it again with a later timeout, which gives the same result as a single run
+		timeout     -- date at which the simulation stops (s)
 		verbose     -- output messages sent and received during the simulation
 		show        -- duration between showing snapshots of the simulation (set to 0 to disable)
+		trace       -- TraceRecorder recording the messages sent and received, much cheaper than the verbose output
+		            the trace is not closed at the end of the run, and does not record the receptions of the messages
+		            broadcast before the run
+		profile     -- measure the time spent in each stage of the engine and each method of the nodes and calculators,
+		            and print a report at the end of the run (see Profiler), the profiler is kept in self.profiler
+		until       -- predicate until(sim) stopping the simulation as soon as it holds, e.g. allLocalized
+		            it is evaluated after the first event of the run, then only when a node changes category,
+		            so it should only depend on the categories of the nodes (see UWNode.setCategory and self.categories)
+		quiet       -- duration (s): stop the simulation once no message has been propagating for this long
+		Returns the convergence time, also kept in self.convergence: the date at which the predicate started to hold,
+		or the date of the last transmission or reception before the quiet period, None if the timeout was reached first
 		"""
-		heappush(self.events, (0, "", None))    # initialize the event list with a tick
-		time = 0
-		showTime = 0
-		if verbose:
-			print "start..."
-		while time <= timeout:
-			time, message, recipient = heappop(self.events)
-			if show > 0 and time >= showTime:
-				print " showing t = " + str(time)
-				self.show()
-				showTime += show
-			if len(message) == 0:               # tick
-				for node in self.nodes:
-					transmission = node.tick(time)
-					if len(transmission) > 0:
-						if verbose:
-							print "%.3f" % time + " >> " + transmission
-						self.broadcast(time, node.position, transmission)
-				heappush(self.events, (time + SIM_TICK, "", None))
-				# update the speed of sound
-				N = 10                  # determines the variation speed
-				self.speedMatrix *= (N - SIM_TICK)
-				self.speedMatrix += SIM_TICK * SND_VAR * np.random.randn(2,2,2)
-				self.speedMatrix /= N
-			else:
-				if verbose:
-					print "%.3f" % time + "    " + message + " >> " + recipient.name
-				reply = recipient.receive(time, message)
-				if len(reply) > 0:
-					if verbose:
-						print "%.3f" % (time + SIM_TICK) + " >> " + reply
-					self.broadcast(time + SIM_TICK, recipient.position, reply)   # the reply is sent after a delay of one tick
+		if profile:
+			from Profiler import Profiler       # only needed when profiling
+			self.profiler = Profiler()
+			self.profiler.attach(self)
+		try:
+			if self.neighborTable is None:
+				self.buildNeighborTable()
+			if trace is not None:
+				trace.attach(self)
+			self.trace = trace
+			self.convergence = None
+			self.categories.changed = until is not None
+			showTime = 0
+			if verbose:
+				print "start..."
+			while True:
+				tickTime = self.nextTickTime()
+				eventTime = self.events.peek()
+				time = min(tickTime, eventTime)
+				if quiet is not None and eventTime == float('inf'):
+					# no message propagating: the quiet period started with the last transmission or reception
+					lastActivity = max(self.counters.lastTransmission, self.counters.lastReception)
+					if time - lastActivity >= quiet and lastActivity + quiet <= timeout:
+						self.convergence = lastActivity
+						break
+				if time > timeout or time == float('inf'):    # timeout reached, or no node left to tick and no message propagating
+					break
+				if show > 0 and time >= showTime:
+					print " showing t = " + str(time)
+					self.show()
+					showTime += show
+				if tickTime <= eventTime:           # ticks come before the messages arriving at the same date
+					self.processTick(self.wakeups[0][0], verbose)
+				else:
+					self.processEvent(timeout, verbose)
+				if self.categories.changed:
+					self.categories.changed = False
+					if until is not None and until(self):
+						self.convergence = time
+						break
+			if trace is not None:
+				trace.flush()
+		finally:
+			self.trace = None               # a failed run does not leave its recorder attached to the next ones
+			if profile:
+				self.profiler.detach()      # restore the methods of the nodes even if the run fails
+		if profile:
+			self.profiler.report()
 		if verbose:
 			print "...end"
+		return self.convergence
+	
+	def statistics(self):
+		"""Gathers the counts of messages transmitted, received and lost since the creation of the environment
+		A loss is counted for each node in range that did not receive a message, receptions are counted when they happen
+		Returns a dictionary holding:
+		    subjects        -- associates to each subject a dictionary {kind: count}, kind being transmissions, receptions or losses
+		    total           -- dictionary {kind: count} for all the subjects
+		    nodes           -- dictionary {kind: array of the counts of each node}
+		    periods         -- dictionary {kind: array of the counts of each period of SIM_PERIOD seconds}
+		    period          -- duration of a period (s)
+		    end             -- date of the last transmission (s)
+		"""
+		return self.counters.summary()
+	
+	def save(self, path):
+		"""Saves the state of the simulation, between two runs, so that it can be resumed later (see load)
+		The state includes the nodes and their calculators, the event list, the speed of sound field, the counters,
+		the state of the random generators and the attributes shared by all the nodes of a class (e.g. slotNumber)
+		path        -- file receiving the state
+		"""
+		classes = []
+		for node in self.nodes:
+			for nodeClass in inspect.getmro(node.__class__):
+				if nodeClass not in [ c for c, attributes in classes ]:
+					attributes = dict( (name, value) for name, value in vars(nodeClass).iteritems()
+					                   if not name.startswith("_") and isinstance(value, (int, long, float, str, list, dict, tuple)) )
+					classes.append((nodeClass, attributes))
+		state = { "sim":        self
+		        , "random":     random.getstate()
+		        , "numpy":      np.random.get_state()
+		        , "classes":    classes
+		        }
+		with open(path, 'wb') as f:
+			pickle.dump(state, f, 2)
+	
+	def reconfigure(self, **parameters):
+		"""Changes parameters of the simulation between two runs, e.g. to fork variants of a saved simulation
+		The spatial index and the neighbor table are rebuilt for the new range
+		parameters  -- new values of the parameters, those of FIXED_PARAMETERS cannot be changed
+		"""
+		for name in FIXED_PARAMETERS:
+			if name in parameters and parameters[name] != getattr(self.config, name):
+				raise ValueError(name + " cannot be changed once the simulation has started")
+		self.config.set(**parameters)
+		self.grid = {}
+		for i, node in enumerate(self.nodes):
+			self.grid.setdefault(self.cell(node.position), []).append(i)
+		self.neighborTable = None
+	
+	def nextTickTime(self):
+		"""Finds the next tick where a node is due, discarding obsolete wake-ups
+		Returns the date of the tick (s), inf if all nodes are dormant
+		"""
+		while len(self.wakeups) > 0 and self.wakeups[0][0] != self.nodeWakeups[self.wakeups[0][1]]:
+			heappop(self.wakeups)
+		return self.wakeups[0][0] * self.config.SIM_TICK if len(self.wakeups) > 0 else float('inf')
+	
+	def processTick(self, tick, verbose = False):
+		"""Ticks all the nodes due at a given tick
+		tick        -- number of the tick
+		verbose     -- output the messages sent
+		"""
+		time = tick * self.config.SIM_TICK
+		self.tick = tick + 1
+		due = []
+		while len(self.wakeups) > 0 and self.wakeups[0][0] == tick:
+			t, i = heappop(self.wakeups)
+			if self.nodeWakeups[i] == tick:
+				self.nodeWakeups[i] = float('inf')
+				due.append(i)
+		due.sort()                              # nodes are ticked in the order they were added
+		self.ticksProcessed += len(due)
+		for i in due:
+			node = self.nodes[i]
+			transmission = node.tick(time)
+			if transmission is not None:
+				if verbose:
+					print "%.3f" % time + " >> " + str(transmission)
+				self.broadcast(time, i, transmission)
+			self.wakeUp(i, node.nextTick(time))
+	
+	def processEvent(self, timeout, verbose = False):
+		"""Delivers the next message of the event list to its next recipients
+		The wavefront keeps delivering the message as long as its next arrival comes before any other event,
+		and is put back in the event list otherwise
+		timeout     -- end of the simulation (s), no message is delivered after it
+		verbose     -- output the messages received and sent
+		"""
+		time, wave = self.events.pop()
+		message = wave.message
+		while True:
+			recipient = wave.recipients[wave.next]
+			wave.next += 1
+			self.tick = max(self.tick, int(time / self.config.SIM_TICK) + 1)       # all the ticks up to this date are past
+			node = self.nodes[recipient]
+			self.counters.reception(time, recipient, message.subject)
+			if self.trace is not None and self.trace.owns(wave.reference):   # not broadcast before the trace was attached
+				self.trace.reception(time, recipient, wave.reference)
+			if verbose:
+				print "%.3f" % time + "    " + str(message) + " >> " + node.name
+			reply = node.receive(time, message)
+			if reply is not None:
+				if verbose:
+					print "%.3f" % (time + self.config.SIM_TICK) + " >> " + str(reply)
+				self.broadcast(time + self.config.SIM_TICK, recipient, reply)   # the reply is sent after a delay of one tick
+			self.wakeUp(recipient, node.nextTick(time))
+			if wave.next == len(wave.recipients):
+				return
+			time = wave.times[wave.next]
+			# the wavefront also stops when a node changed category, for the termination condition to be checked at this date
+			if time > timeout or time >= self.nextTickTime() or time >= self.events.peek() or self.categories.changed:
+				self.events.push(time, wave)
+				return
+	
+	def wakeUp(self, i, time):
+		"""Schedules the next tick of a node, replacing the one previously scheduled
+		i           -- index of the node
+		time        -- date from which the node must be ticked (s), inf if the node is dormant
+		            the node is woken up at the first tick not yet processed after this date
+		"""
+		if time == float('inf'):
+			self.nodeWakeups[i] = time
+			return
+		# the tolerance may wake the node one tick early, which is harmless: it will simply ask for the same date again
+		tick = max(int(ceil(time / self.config.SIM_TICK - 0.01)), self.tick)
+		if tick != self.nodeWakeups[i]:
+			self.nodeWakeups[i] = tick
+			heappush(self.wakeups, (tick, i))
+	
+	def updateSpeed(self, time):
+		"""Brings the speed of sound field to its state at a given date
+		Every tick the field evolves as S <- (S * (N - SIM_TICK) + SIM_TICK * SND_VAR * randn) / N
+		The n ticks elapsed since the last update are applied at once: S <- a^n S + b * sqrt(1 + a^2 + ... + a^(2n-2)) * randn
+		which has the same distribution as n successive updates
+		time        -- date (s), the updates of all the ticks strictly before this date are applied
+		"""
+		tick = self.config.SIM_TICK
+		ticks = int(ceil(time / tick - 0.01))
+		n = ticks - self.speedTicks
+		if n <= 0:
+			return
+		N = 10                  # determines the variation speed
+		a = (N - tick) / N
+		b = tick * self.config.SND_VAR / N
+		self.speedMatrix *= a**n
+		self.speedMatrix += b * sqrt((1 - a**(2*n)) / (1 - a*a)) * np.random.randn(2,2,2)
+		self.speedTicks = ticks
 	
 	def speedOfSound(self, position):
-		x, y, z = position
-		v = self.speedMatrix + np.ones((2,2,2))
-		# we average the matrix along each axis
-		v = np.average(v, axis=0, weights=(x, self.maxX-x))
-		v = np.average(v, axis=0, weights=(y, self.maxY-y))
-		v = np.average(v, axis=0, weights=(z, self.minZ-z))
-		return v * SND_SPEED
-	
-	def broadcast(self, time, position, message):
+		"""Calculates the speed of sound at a given position
+		position    -- X,Y,Z coordinates (m,m,m)
+		Returns the speed of sound (m/s)
+		"""
+		return self.speedsOfSound(np.array([position], dtype=float))[0]
+	
+	def speedsOfSound(self, positions):
+		"""Calculates the speed of sound at a set of positions
+		The variation matrix gives the relative variation of the speed of sound at the corners of the simulation space,
+		and is interpolated linearly along each axis (index 0 corresponding to the far side: x = maxX, y = maxY, z = minZ)
+		positions   -- array of M rows of X,Y,Z coordinates (m,m,m)
+		Returns an array of M speeds of sound (m/s)
+		"""
+		a = positions[:,0] / self.maxX          # weight of the far side along each axis
+		b = positions[:,1] / self.maxY
+		c = positions[:,2] / self.minZ
+		wx = np.stack((a, 1-a), axis=1)
+		wy = np.stack((b, 1-b), axis=1)
+		wz = np.stack((c, 1-c), axis=1)
+		# the weights along each axis sum to 1, so the matrix can be interpolated without adding the average speed first
+		v = np.einsum('mi,mj,mk,ijk->m', wx, wy, wz, self.speedMatrix)
+		return (1 + v) * self.config.SND_SPEED
+	
+	def broadcast(self, time, sender, message):
 		"""Schedules a message to be recieved by all nodes in range
 		time        -- date of transmission (s)
-		position    -- position of broadcasting node (m,m,m)
+		sender      -- index of the broadcasting node
 		message     -- message to be broadcast
 		"""
-		for node in self.nodes:
-			d = distance(node.position, position)
-			if d > 0 and d <= SIM_RANGE and uniform(0,1) > SIM_LOSS:
-				toa = time + d / self.speedOfSound(node.position)
-				heappush(self.events, (toa, message, node))
+		reference = self.trace.transmission(time, sender, message) if self.trace is not None else None
+		recipients, d = self.neighbors(sender)
+		if self.config.SIM_LOSS > 0:
+			received = np.random.uniform(0, 1, len(recipients)) > self.config.SIM_LOSS
+			self.counters.transmission(time, sender, message.subject, recipients[~received])
+			recipients = recipients[received]
+			d = d[received]
+		else:
+			self.counters.transmission(time, sender, message.subject, ())
+		self.updateSpeed(time)
+		speeds = self.speedsOfSound(self.positions[recipients])
+		self.schedule(time + d / speeds, message, recipients, reference)
+	
+	def schedule(self, times, message, recipients, reference = None):
+		"""Adds a set of receptions of the same message to the event list, as a single wavefront
+		times       -- dates of reception (s)
+		message     -- message received
+		recipients  -- indices of the recipients
+		reference   -- reference of the message in the trace, if it is recorded
+		"""
+		if len(recipients) == 0:
+			return
+		order = np.argsort(times, kind='mergesort')     # stable, recipients arriving at the same date keep their order
+		wave = Wavefront(message, list(times[order]), recipients[order].tolist(), reference)
+		self.events.push(wave.times[0], wave)
+		if len(self.events) > self.peakQueue:
+			self.peakQueue = len(self.events)
 	
 	def show(self):
 		"""Displays a 3D plot of the nodes"""
@@ -133,6 +474,47 @@ class SimEnvironment:
 		mng.resize(*mng.window.maxsize())
 		plt.show()
 	
+class Wavefront:
+	"""A message propagating from its sender, reaching its recipients one after the other"""
+	def __init__(self, message, times, recipients, reference = None):
+		"""Creates a wavefront
+		message     -- message broadcast
+		times       -- dates of reception, in increasing order (s)
+		recipients  -- indices of the recipients, in the same order as the dates
+		reference   -- reference of the message in the trace, if it is recorded
+		"""
+		self.message = message
+		self.times = times
+		self.recipients = recipients
+		self.reference = reference
+		self.next = 0           # position of the next recipient to reach
+	
+	def __len__(self):
+		return len(self.recipients) - self.next
+
+def allLocalized(sim):
+	"""Termination condition for SimEnvironment.run: holds when every node is localized or acts as an anchor"""
+	return sim.categories.counts[UNLOCALIZED] == 0
+
+def load(path, **parameters):
+	"""Restores a simulation saved by SimEnvironment.save, including the state of the random generators
+	A saved simulation can be loaded several times, each copy being independent
+	path        -- file holding the state
+	parameters  -- parameters to change in the restored simulation (see SimEnvironment.reconfigure)
+	Returns the simulation environment, ready to be run further
+	"""
+	with open(path, 'rb') as f:
+		state = pickle.load(f)
+	random.setstate(state["random"])
+	np.random.set_state(state["numpy"])
+	for nodeClass, attributes in state["classes"]:
+		for name, value in attributes.iteritems():
+			setattr(nodeClass, name, value)
+	sim = state["sim"]
+	if len(parameters) > 0:
+		sim.reconfigure(**parameters)
+	return sim
+
 def distance(position1, position2):
 	"""Calculates an euclidian distance
 	position1   -- X,Y,Z coordinates of the first point (m,m,m)
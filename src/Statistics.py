@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+from UWNode import CATEGORIES
+
+import numpy as np
+
+# kinds of counts
+TRANSMISSIONS = 0       # messages broadcast
+RECEPTIONS = 1          # messages delivered to a node in range
+LOSSES = 2              # messages that a node in range did not receive
+KINDS = ["transmissions", "receptions", "losses"]
+
+class ChannelStatistics:
+	"""Counts the messages transmitted, received and lost during a simulation, per subject, per node and per period of time
+	The counters are plain integers updated as the messages are broadcast and delivered, see SimEnvironment.statistics
+	"""
+	def __init__(self, period):
+		"""Creates empty counters
+		period      -- duration of the periods of time counted separately (s)
+		"""
+		self.period = period
+		self.subjects = {}                  # associates to each subject its counts [transmissions, receptions, losses]
+		self.nodes = [ [], [], [] ]         # counts of each kind for each node, indexed by node
+		self.periods = [ [], [], [] ]       # counts of each kind for each period, period k covering [k*period, (k+1)*period)
+		self.lastTransmission = 0           # date of the last transmission (s)
+		self.lastReception = 0              # date of the last reception (s)
+	
+	def addNode(self):
+		"""Adds the counters of a new node"""
+		for counts in self.nodes:
+			counts.append(0)
+	
+	def count(self, kind, time, n = 1):
+		"""Adds to the counter of the period including a date"""
+		k = int(time / self.period)
+		counts = self.periods[kind]
+		if k >= len(counts):
+			counts.extend([0] * (k + 1 - len(counts)))
+		counts[k] += n
+	
+	def transmission(self, time, sender, subject, lost):
+		"""Counts the transmission of a message
+		time        -- date of transmission (s)
+		sender      -- index of the broadcasting node
+		subject     -- subject of the message
+		lost        -- indices of the nodes in range that will not receive the message
+		"""
+		counts = self.subjects.get(subject)
+		if counts is None:
+			counts = self.subjects[subject] = [0, 0, 0]
+		counts[TRANSMISSIONS] += 1
+		self.nodes[TRANSMISSIONS][sender] += 1
+		self.count(TRANSMISSIONS, time)
+		if len(lost) > 0:
+			counts[LOSSES] += len(lost)
+			nodeLosses = self.nodes[LOSSES]
+			for i in lost:
+				nodeLosses[i] += 1
+			self.count(LOSSES, time, len(lost))
+		self.lastTransmission = time
+	
+	def reception(self, time, receiver, subject):
+		"""Counts the reception of a message
+		time        -- date of reception (s)
+		receiver    -- index of the receiving node
+		subject     -- subject of the message
+		"""
+		self.subjects[subject][RECEPTIONS] += 1
+		self.nodes[RECEPTIONS][receiver] += 1
+		self.count(RECEPTIONS, time)
+		self.lastReception = time
+	
+	def summary(self):
+		"""Gathers the counters
+		Returns a dictionary holding:
+		    subjects        -- associates to each subject a dictionary {kind: count}, kind being transmissions, receptions or losses
+		    total           -- dictionary {kind: count} for all the subjects
+		    nodes           -- dictionary {kind: array of the counts of each node}
+		    periods         -- dictionary {kind: array of the counts of each period}
+		    period          -- duration of a period (s)
+		    end             -- date of the last transmission (s)
+		"""
+		n = max(len(counts) for counts in self.periods)
+		return { "subjects":   dict( (s, dict(zip(KINDS, counts))) for s, counts in self.subjects.iteritems() )
+		       , "total":      dict( (kind, sum(counts[k] for counts in self.subjects.itervalues())) for k, kind in enumerate(KINDS) )
+		       , "nodes":      dict( (kind, np.array(self.nodes[k], dtype=int)) for k, kind in enumerate(KINDS) )
+		       , "periods":    dict( (kind, np.array(self.periods[k] + [0] * (n - len(self.periods[k])), dtype=int)) for k, kind in enumerate(KINDS) )
+		       , "period":     self.period
+		       , "end":        self.lastTransmission
+		       }
+
+class NodeCategories:
+	"""Counts the nodes of each category (UNLOCALIZED, LOCALIZED, ANCHOR, see UWNode.setCategory)
+	The nodes update the counts themselves when they change category
+	"""
+	def __init__(self):
+		"""Creates empty counts"""
+		self.counts = [ 0 for c in CATEGORIES ]     # number of nodes of each category
+		self.changed = False        # whether a node was added or changed category since the flag was last cleared
+	
+	def add(self, category):
+		"""Counts a new node"""
+		self.counts[category] += 1
+		self.changed = True
+	
+	def move(self, old, new):
+		"""Counts a node changing category
+		old         -- previous category of the node
+		new         -- new category of the node
+		"""
+		self.counts[old] -= 1
+		self.counts[new] += 1
+		self.changed = True
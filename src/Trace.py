@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+from Message import Message
+
+import numpy as np
+import json
+import uuid
+import os
+
+# columns of the event records: one record per transmission (receiver -1) and per reception
+EVENT_COLUMNS = [ ("time",     np.dtype('<f8'))     # date of the event (s)
+                , ("sender",   np.dtype('<i4'))     # index of the node that broadcast the message
+                , ("receiver", np.dtype('<i4'))     # index of the node that received the message, -1 for the transmission
+                , ("subject",  np.dtype('<i2'))     # code of the subject of the message, see Trace.subjects
+                , ("payload",  np.dtype('<i8'))     # offset of the data of the message in the payload columns
+                , ("size",     np.dtype('<i2'))     # number of data values of the message
+                ]
+# columns of the payload: one record per data value, shared by the transmission of a message and all its receptions
+PAYLOAD_COLUMNS = [ ("value",  np.dtype('<f8'))     # numerical value, nan for strings
+                  , ("string", np.dtype('<i4'))     # code of the string (see Trace.strings), FLOAT or INTEGER for numbers
+                  ]
+FLOAT = -1      # codes of the numbers in the string column
+INTEGER = -2
+
+class TraceRecorder:
+	"""Records the messages transmitted and received during a simulation, in binary columns
+	The records are stored in preallocated buffers, written to disk every time they are full
+	Each column is a raw binary file of the trace directory, described by the file meta.json, see Trace
+	"""
+	def __init__(self, path, chunk = 65536):
+		"""Creates an empty trace
+		path        -- directory of the trace, created if needed
+		chunk       -- number of records kept in memory before writing them to disk
+		"""
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		self.path = path
+		self.chunk = chunk
+		self.events = dict( (name, np.zeros(chunk, dtype)) for name, dtype in EVENT_COLUMNS )
+		self.payload = dict( (name, np.zeros(chunk, dtype)) for name, dtype in PAYLOAD_COLUMNS )
+		self.files = dict( (name, open(os.path.join(path, name + ".bin"), 'wb')) for name, dtype in EVENT_COLUMNS + PAYLOAD_COLUMNS )
+		self.eventCount = 0         # number of event records, including those already written
+		self.payloadCount = 0       # number of payload records, including those already written
+		self.eventBuffered = 0      # number of event records in the buffers
+		self.payloadBuffered = 0    # number of payload records in the buffers
+		self.subjects = {}          # code of each subject
+		self.strings = {}           # code of each string found in the data of the messages
+		self.nodes = []             # names of the nodes of the simulation
+		self.identity = uuid.uuid4().hex    # tag of the references returned by this recorder, kept by saved simulations
+	
+	def attach(self, sim):
+		"""Prepares the trace to record a simulation
+		sim         -- simulation environment
+		"""
+		self.nodes = [ node.name for node in sim.nodes ]
+	
+	def transmission(self, time, sender, message):
+		"""Records the transmission of a message
+		time        -- date of transmission (s)
+		sender      -- index of the broadcasting node
+		message     -- message broadcast
+		Returns a reference to the recorded message, to be given for each of its receptions (see owns)
+		"""
+		subject = self.subjects.setdefault(message.subject, len(self.subjects))
+		data = message.data
+		if self.payloadBuffered + len(data) > self.chunk:
+			self.flush()
+		offset = self.payloadCount
+		values = self.payload["value"]
+		strings = self.payload["string"]
+		n = self.payloadBuffered
+		for e in data:
+			if isinstance(e, str):
+				values[n] = np.nan
+				strings[n] = self.strings.setdefault(e, len(self.strings))
+			else:
+				values[n] = e
+				strings[n] = INTEGER if isinstance(e, (int, long, np.integer)) else FLOAT
+			n += 1
+		self.payloadBuffered = n
+		self.payloadCount += len(data)
+		reference = (self.identity, sender, subject, offset, len(data))
+		self.record(time, -1, reference)
+		return reference
+	
+	def owns(self, reference):
+		"""Tells whether a message was recorded by this recorder, so that its receptions can be recorded
+		Messages broadcast before the recorder was attached have no reference, or one of another recorder
+		reference   -- reference to the message, None if it was not recorded
+		"""
+		return reference is not None and reference[0] == self.identity
+	
+	def reception(self, time, receiver, reference):
+		"""Records the reception of a message
+		time        -- date of reception (s)
+		receiver    -- index of the receiving node
+		reference   -- reference to the message, returned by transmission (see owns)
+		"""
+		self.record(time, receiver, reference)
+	
+	def record(self, time, receiver, reference):
+		"""Adds an event record"""
+		if self.eventBuffered == self.chunk:
+			self.flush()
+		n = self.eventBuffered
+		identity, sender, subject, offset, size = reference
+		events = self.events
+		events["time"][n] = time
+		events["sender"][n] = sender
+		events["receiver"][n] = receiver
+		events["subject"][n] = subject
+		events["payload"][n] = offset
+		events["size"][n] = size
+		self.eventBuffered += 1
+		self.eventCount += 1
+	
+	def flush(self):
+		"""Writes the buffered records to disk"""
+		for name, dtype in EVENT_COLUMNS:
+			self.events[name][:self.eventBuffered].tofile(self.files[name])
+		for name, dtype in PAYLOAD_COLUMNS:
+			self.payload[name][:self.payloadBuffered].tofile(self.files[name])
+		self.eventBuffered = 0
+		self.payloadBuffered = 0
+	
+	def close(self):
+		"""Writes the remaining records to disk, and describes the trace in the file meta.json"""
+		self.flush()
+		for f in self.files.itervalues():
+			f.close()
+		meta = { "events":     self.eventCount
+		       , "payload":    self.payloadCount
+		       , "columns":    dict( (name, dtype.str) for name, dtype in EVENT_COLUMNS + PAYLOAD_COLUMNS )
+		       , "subjects":   sorted(self.subjects, key = self.subjects.get)
+		       , "strings":    sorted(self.strings, key = self.strings.get)
+		       , "nodes":      self.nodes
+		       }
+		with open(os.path.join(self.path, "meta.json"), 'w') as f:
+			json.dump(meta, f)
+
+class Trace:
+	"""Trace recorded by a TraceRecorder, mapped in memory without any parsing
+	The columns are numpy arrays: events["time"], events["sender"], etc. (see EVENT_COLUMNS and PAYLOAD_COLUMNS)
+	"""
+	def __init__(self, path):
+		"""Opens a trace
+		path        -- directory of the trace
+		"""
+		with open(os.path.join(path, "meta.json")) as f:
+			meta = json.load(f)
+		self.subjects = [ str(s) for s in meta["subjects"] ]    # subject of each code
+		self.strings = [ str(s) for s in meta["strings"] ]      # string of each code
+		self.nodes = [ str(s) for s in meta["nodes"] ]          # name of each node
+		self.events = {}
+		for name, dtype in EVENT_COLUMNS:
+			self.events[name] = self.load(path, name, meta["columns"][name], meta["events"])
+		self.payload = {}
+		for name, dtype in PAYLOAD_COLUMNS:
+			self.payload[name] = self.load(path, name, meta["columns"][name], meta["payload"])
+	
+	def load(self, path, name, dtype, length):
+		"""Maps a column in memory (an empty file cannot be mapped)"""
+		if length == 0:
+			return np.zeros(0, dtype)
+		return np.memmap(os.path.join(path, name + ".bin"), dtype = dtype, mode = 'r', shape = (length,))
+	
+	def __len__(self):
+		return len(self.events["time"])
+	
+	def subject(self, subject):
+		"""Selects the records of a subject
+		subject     -- subject of the messages
+		Returns a boolean mask of the event records
+		"""
+		if subject not in self.subjects:
+			return np.zeros(len(self), dtype = bool)
+		return self.events["subject"] == self.subjects.index(subject)
+	
+	def transmissions(self):
+		"""Returns a boolean mask of the event records that are transmissions"""
+		return self.events["receiver"] == -1
+	
+	def message(self, i):
+		"""Rebuilds the message of an event record
+		i           -- index of the record
+		Returns the message
+		"""
+		offset = self.events["payload"][i]
+		data = []
+		for k in xrange(offset, offset + self.events["size"][i]):
+			code = self.payload["string"][k]
+			if code >= 0:
+				data.append(self.strings[code])
+			elif code == INTEGER:
+				data.append(int(self.payload["value"][k]))
+			else:
+				data.append(float(self.payload["value"][k]))
+		return Message(self.nodes[self.events["sender"][i]], self.subjects[self.events["subject"][i]], tuple(data))
+	
+	def format(self, i):
+		"""Describes an event record in the format of the verbose output of SimEnvironment.run
+		i           -- index of the record
+		Returns a string
+		"""
+		time = self.events["time"][i]
+		receiver = self.events["receiver"][i]
+		if receiver == -1:
+			return "%.3f" % time + " >> " + str(self.message(i))
+		return "%.3f" % time + "    " + str(self.message(i)) + " >> " + self.nodes[receiver]
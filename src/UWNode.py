@@ -1,7 +1,24 @@
 #!/usr/bin/env python
 
-class UWNode:
-	"""Generic class representing a node (sensor, buoy, etc...)"""
+from parameters import Config
+
+import numpy as np
+
+# categories of the nodes, whatever the states of their protocol, see UWNode.setCategory
+UNLOCALIZED = 0     # the node does not know its position
+LOCALIZED = 1       # the node knows its position
+ANCHOR = 2          # the node knows its position and acts as an anchor for the other nodes
+CATEGORIES = ["UNLOCALIZED", "LOCALIZED", "ANCHOR"]
+
+defaultConfig = Config()    # parameters used by the nodes until they are added to a simulation
+
+class UWNode(object):
+	"""Generic class representing a node (sensor, buoy, etc...)
+	The attributes of the nodes are declared in __slots__, so that large deployments fit in memory
+	(subclasses that do not declare __slots__ simply get a __dict__)
+	"""
+	__slots__ = ("name", "positions", "index", "config", "category", "categories", "sim")
+	
 	def __init__(self, name, position = (-1,-1,0)):
 		"""Create a node
 		name        -- string identifying the node
@@ -9,22 +26,68 @@ class UWNode:
 		            the default coordinates will be out of bounds of the simulation space, forcing a random assignment
 		"""
 		self.name = name
-		self.position = position
+		self.positions = np.array([position], dtype=float)  # array holding the position of the node, in row self.index
+		self.index = 0                  # the array is that of the simulation once the node is added to it (see SimEnvironment.addNode)
+		self.config = defaultConfig     # parameters used by the node, replaced by those of the simulation when the node is added to it
+		self.category = UNLOCALIZED     # category of the node, see setCategory
+		self.categories = None          # counts of the nodes of each category, set by the simulation when the node is added to it
+		self.sim = None                 # simulation environment the node was added to (see SimEnvironment.addNode)
+	
+	@property
+	def position(self):
+		"""X,Y,Z coordinates of the node (m,m,m)
+		Once the node is added to a simulation, it is moved by the environment, which keeps its neighbor table up to date
+		"""
+		return tuple(self.positions[self.index].tolist())
+	
+	@position.setter
+	def position(self, position):
+		if self.sim is not None:
+			self.sim.moveNode(self, position)
+		else:
+			self.positions[self.index] = position
 	
 	def tick(self, time):
 		"""Function called every tick, lets the node perform operations
 		time        -- date of polling (s)
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
-		return ""
+		return None
 	
 	def receive(self, time, message):
 		"""Function called when a message broadcast by another node arrives at the node
 		time        -- date of reception (s)
 		message     -- message received
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
+		"""
+		return None
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		Returns the date from which the node must be ticked again (s), or inf if the node is dormant until it receives a message
+		The node may be ticked earlier than requested, but it must not miss any tick where it would change its state
+		By default the node is ticked every tick
+		"""
+		return time
+	
+	def setCategory(self, category):
+		"""Changes the category of the node, keeping the counts of the simulation up to date (see Statistics.NodeCategories)
+		Protocols call it when the state of the node changes its category, so that the simulation can check
+		termination conditions without looking at every node (see SimEnvironment.run)
+		category    -- UNLOCALIZED, LOCALIZED or ANCHOR
+		"""
+		if category != self.category:
+			if self.categories is not None:
+				self.categories.move(self.category, category)
+			self.category = category
+	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		A generic node never localizes itself
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
 		"""
-		return ""
+		return None
 	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+# micro-benchmarks of the simulation engine
+# usage: python benchmark.py [name ...]
+# available benchmarks: broadcast, speed, queue, memory, solver, accumulation
+
+from SimEnvironment import SimEnvironment, distance
+from EventQueue import HeapQueue, CalendarQueue
+from UWNode import UWNode
+from Message import Message
+from PositionCalculator import UPSCalculator, TOACalculator, TDOACalculator, STATUS_MESSAGES
+from parameters import Config
+from lst import LSTNode
+from rls import RLSNode
+from hrls import HRLSNode
+
+from random import uniform, expovariate
+from multiprocessing import Pool
+from math import sqrt
+import cPickle as pickle
+import numpy as np
+import resource
+import random
+import sys
+import os
+import time as clock
+
+def makeDeployment(n, L=400., depth=500.):
+	"""Creates a simulation environment filled with idle nodes
+	n           -- number of nodes
+	L           -- average distance between two nodes (m), keeps the node density constant regardless of n
+	depth       -- depth of the simulation space (m)
+	Returns the simulation environment
+	"""
+	D = L * sqrt(n)
+	sim = SimEnvironment((D, D, depth))
+	for i in xrange(n):
+		sim.addNode(UWNode("node-" + str(i)))     # random position
+	return sim
+
+def bruteForceBroadcast(sim, time, sender, message):
+	"""Reference implementation of SimEnvironment.broadcast, checking every node of the simulation"""
+	position = sim.nodes[sender].position
+	for i, node in enumerate(sim.nodes):
+		d = distance(node.position, position)
+		if d > 0 and d <= sim.config.SIM_RANGE and uniform(0,1) > sim.config.SIM_LOSS:
+			toa = time + d / sim.speedOfSound(node.position)
+			sim.events.push(toa, (message, i))
+
+def benchBroadcast(sizes=(400, 4000, 40000), duration=2.):
+	"""Measures the number of messages broadcast per second, for several deployment sizes
+	sizes       -- numbers of nodes to test
+	duration    -- approximate duration of each measurement (s)
+	"""
+	print "broadcast: messages/s (receptions/message)"
+	print "{:>8} {:>18} {:>18}".format("nodes", "engine", "brute force")
+	for n in sizes:
+		sim = makeDeployment(n)
+		start = clock.time()
+		sim.buildNeighborTable()
+		print "{:>8} nodes: neighbor table built in {:.3f} s".format(n, clock.time() - start)
+		results = []
+		message = Message("node", "benchmark", ())
+		for method in (SimEnvironment.broadcast, bruteForceBroadcast):
+			count = 0
+			sim.events = HeapQueue()
+			start = clock.time()
+			while clock.time() - start < duration:
+				method(sim, 0, count % n, message)
+				count += 1
+			elapsed = clock.time() - start
+			results.append("%10.1f (%5.1f)" % (count / elapsed, len(sim.events) / float(count)))
+		print "{:>8} {:>18} {:>18}".format(n, *results)
+
+def referenceSpeedOfSound(sim, position):
+	"""Reference implementation of SimEnvironment.speedOfSound, averaging the variation matrix along each axis"""
+	x, y, z = position
+	v = sim.speedMatrix + np.ones((2,2,2))
+	v = np.average(v, axis=0, weights=(x, sim.maxX-x))
+	v = np.average(v, axis=0, weights=(y, sim.maxY-y))
+	v = np.average(v, axis=0, weights=(z, sim.minZ-z))
+	return v * sim.config.SND_SPEED
+
+def benchSpeed(sizes=(1, 10, 100, 1000), duration=1.):
+	"""Compares the batched speed of sound evaluation to the per-point reference implementation
+	sizes       -- numbers of points evaluated at once
+	duration    -- approximate duration of each measurement (s)
+	"""
+	sim = makeDeployment(400)
+	sim.speedMatrix = 0.05 * np.random.randn(2,2,2)     # large variations, to make any discrepancy visible
+	print "speed of sound: points/s (max relative difference)"
+	print "{:>8} {:>14} {:>14} {:>10}".format("points", "batched", "per point", "")
+	for m in sizes:
+		positions = sim.positions[np.random.randint(0, len(sim.nodes), m)]
+		expected = np.array([ referenceSpeedOfSound(sim, p) for p in positions ])
+		error = np.max(np.abs(sim.speedsOfSound(positions) - expected) / expected)
+		results = []
+		for method in (lambda: sim.speedsOfSound(positions),
+		               lambda: [ referenceSpeedOfSound(sim, p) for p in positions ]):
+			count = 0
+			start = clock.time()
+			while clock.time() - start < duration:
+				method()
+				count += 1
+			results.append(count * m / (clock.time() - start))
+		print "{:>8} {:>14.1f} {:>14.1f} {:>10.1e}".format(m, results[0], results[1], error)
+
+def makeGrid(nodeClass, R, L=400., queue=HeapQueue):
+	"""Creates a TEST 2-like deployment, as in test.py: a jittered grid of nodes around 4 initial anchors
+	nodeClass   -- class of the nodes, created with (id, position, localized)
+	R           -- number of nodes on each side of the grid
+	L           -- distance between two nodes (m)
+	queue       -- class of the event queue
+	Returns the simulation environment
+	"""
+	D = R * L
+	sim = SimEnvironment((D, D, 500), queue)
+	anchors = [ (D/2 - L, D/2 - L, 0), (D/2 + L, D/2 - L, 0), (D/2, D/2 + L, 0), (D/2, D/2 + L, -300) ]
+	for n, p in enumerate(anchors):
+		sim.addNode(nodeClass(n, p, True))
+	n = len(anchors)
+	for i in xrange(R):
+		for j in xrange(R):
+			idealPosition = np.array([(0.5 + i) * L, (0.5 + j) * L, -300])
+			sim.addNode(nodeClass(n, np.random.normal(idealPosition, 50), False))
+			n += 1
+	return sim
+
+def benchQueue(pending=7500, operations=200000, duration=5000., seed=1):
+	"""Compares the heap and calendar event queues
+	pending     -- number of events in the queue for the hold model (about the peak of a TEST 2 run)
+	operations  -- number of pop/push pairs for the hold model
+	duration    -- simulated duration of the TEST 2 run (s)
+	seed        -- random seed of the TEST 2 run
+	"""
+	print "event queue: hold model, %d pending events, %d operations" % (pending, operations)
+	for queue in (HeapQueue, CalendarQueue):
+		q = queue()
+		delays = [ uniform(0, 0.7) for i in xrange(pending + operations) ]     # typical propagation delays (s)
+		for i in xrange(pending):
+			q.push(delays[i], i)
+		start = clock.time()
+		for i in xrange(pending, pending + operations):
+			time, event = q.pop()
+			q.push(time + delays[i], i)
+		elapsed = clock.time() - start
+		print "{:>14}: {:10.1f} operations/s".format(queue.__name__, operations / elapsed)
+	print "event queue: TEST 2 run (20x20 RLS nodes), %d s" % duration
+	results = []
+	for queue in (HeapQueue, CalendarQueue):
+		random.seed(seed)
+		np.random.seed(seed)
+		RLSNode.slotNumber = 0
+		sim = makeGrid(RLSNode, 20, queue=queue)
+		stdout = sys.stdout
+		sys.stdout = open(os.devnull, 'w')      # silence the nodes
+		start = clock.time()
+		sim.run(duration)
+		elapsed = clock.time() - start
+		sys.stdout = stdout
+		results.append([ n.positionEstimates for n in sim.nodes ])
+		print "{:>14}: {:10.2f} s, {} events scheduled".format(queue.__name__, elapsed, sim.events.count)
+	print "      same results: " + str(results[0] == results[1])
+
+def residentMemory():
+	"""Returns the memory currently used by the process (bytes), as counted by Linux"""
+	with open("/proc/self/statm") as f:
+		return int(f.read().split()[1]) * resource.getpagesize()
+
+def measureMemory(task):
+	"""Measures the memory used by a deployment, in a fresh process so that earlier measurements do not interfere
+	task        -- (class of the nodes, number of nodes on each side of the grid)
+	Returns the number of nodes and the memory they use (bytes)
+	"""
+	nodeClass, R = task
+	before = residentMemory()
+	sim = makeGrid(nodeClass, R)
+	return len(sim.nodes), residentMemory() - before
+
+def benchMemory(R=316):
+	"""Measures the memory used per node, including the bookkeeping of the simulation environment
+	R           -- number of nodes on each side of the grid, about 100000 nodes by default
+	"""
+	print "memory: %d nodes, before running" % (R * R + 4)
+	for nodeClass in (LSTNode, RLSNode, HRLSNode):
+		pool = Pool(1, maxtasksperchild = 1)
+		n, memory = pool.map(measureMemory, [(nodeClass, R)])[0]
+		pool.close()
+		pool.join()
+		print "{:>14}: {:10.1f} MB, {:6.0f} bytes/node".format(nodeClass.__name__, memory / 1e6, memory / float(n))
+
+def referenceToa(calculator, data):
+	"""Reference implementation of TOACalculator.calculate, filling the Jacobian row by row and inverting the normal matrix"""
+	X = calculator.priorPosition[:]
+	N = len(data)
+	for k in xrange(calculator.config.TOA_ITERMAX):
+		R = np.zeros(N)
+		J = np.zeros((N,3))
+		for i, a in enumerate(calculator.anchors):
+			dist = np.linalg.norm(calculator.positions[a] - X)
+			R[i] = data[i] - dist
+			J[i] = (calculator.positions[a] - X) / dist
+		try:
+			diff = np.linalg.inv(J.T.dot(J)).dot(J.T).dot(R)
+		except np.linalg.linalg.LinAlgError:
+			return "could not be solved", np.zeros(3)
+		X = X - diff
+		if np.linalg.norm(diff) < calculator.config.TOA_THRESHOLD:
+			return "ok", X
+	return "reached iteration maximum", X
+
+def referenceTdoa(calculator, data):
+	"""Reference implementation of TDOACalculator.calculate, filling the Jacobian row by row and inverting the normal matrix"""
+	X = calculator.priorPosition[:]
+	N = len(data)
+	for k in xrange(calculator.config.TOA_ITERMAX):
+		R = np.zeros(N)
+		J = np.zeros((N,3))
+		a0 = calculator.anchors[-1]
+		dist0 = np.linalg.norm(calculator.positions[a0] - X)
+		j0 = (calculator.positions[a0] - X) / dist0
+		for i in xrange(N):
+			a = calculator.anchors[i]
+			dist = np.linalg.norm(calculator.positions[a] - X)
+			R[i] = data[i] - (dist0 - dist)
+			J[i] = j0 - (calculator.positions[a] - X) / dist
+		try:
+			diff = np.linalg.inv(J.T.dot(J)).dot(J.T).dot(R)
+		except np.linalg.linalg.LinAlgError:
+			return "could not be solved", np.zeros(3)
+		X = X - diff
+		if np.linalg.norm(diff) < calculator.config.TOA_THRESHOLD:
+			return "ok", X
+	return "reached iteration maximum", X
+
+def makeSolverProblem(calculatorClass, anchors, spread, noise=1., prior=20.):
+	"""Creates a localization problem at the depth of the nodes of a TEST 2 deployment, as a calculator and its compiled data
+	calculatorClass -- TOACalculator or TDOACalculator
+	anchors     -- number of anchors, the last one being the master for TDOA
+	spread      -- standard deviation of the depths of the node and the anchors around -300 m (m)
+	            when it tends to 0, the node and its anchors become coplanar and the depth cannot be determined
+	noise       -- standard deviation of the distances measured (m)
+	prior       -- standard deviation of the error of the prior position (m)
+	Returns the calculator, its compiled data and the position of the node
+	"""
+	position = np.array([0., 0., -300. + spread * np.random.randn()])
+	calculator = calculatorClass(position + prior * np.random.randn(3))
+	for i in xrange(anchors):
+		angle = np.random.uniform(0, 2 * np.pi)
+		radius = np.random.uniform(200, 800)
+		calculator.addAnchor(i, (radius * np.cos(angle), radius * np.sin(angle), -300. + spread * np.random.randn()))
+	P = np.array([ calculator.positions[a] for a in calculator.anchors ])
+	dist = np.sqrt(((P - position)**2).sum(axis=1)) + noise * np.random.randn(anchors)
+	data = dist if calculatorClass is TOACalculator else dist[-1] - dist[:-1]
+	return calculator, data, position
+
+def solveBatch(calculatorClass, problems):
+	"""Solves problems created by makeSolverProblem in a single batch
+	Returns the error message and the position found for each problem, as calculate does
+	"""
+	calculators, data, positions = zip(*problems)
+	anchors = np.array([ calculator.anchorPositions() for calculator in calculators ])
+	priors = np.array([ calculator.priorPosition for calculator in calculators ])
+	status, positions = calculatorClass.calculateBatch(anchors, np.array(data), calculators[0].config, priors)
+	return [ (STATUS_MESSAGES[s], p) for s, p in zip(status, positions) ]
+
+def benchSolver(trials=2000, spreads=(100., 10., 1., 0.), tolerance=10., seed=1):
+	"""Compares the Gauss-Newton solvers of TOACalculator and TDOACalculator to the reference implementations
+	Each solver is run problem by problem, and all problems at once with calculateBatch
+	trials      -- number of problems for each spread of the depths
+	spreads     -- standard deviations of the depths of the node and its anchors (m), see makeSolverProblem
+	tolerance   -- largest error of a position found to be counted as correct (m)
+	seed        -- random seed of the problems
+	"""
+	print "position solvers: solves/s, and outcome of %d problems for each spread of the depths" % trials
+	print "(ok: position found, wrong: position found more than %g m away, failed: no position)" % tolerance
+	print "{:>14} {:>8} {:>10} {:>10} {:>10} {:>10}".format("", "spread", "solves/s", "ok %", "wrong %", "failed %")
+	for calculatorClass, reference, anchors in ((TOACalculator, referenceToa, 6), (TDOACalculator, referenceTdoa, 7)):
+		for spread in spreads:
+			np.random.seed(seed)
+			problems = [ makeSolverProblem(calculatorClass, anchors, spread) for i in xrange(trials) ]
+			methods = [ (calculatorClass.__name__, lambda: [ calculator.calculate(data) for calculator, data, position in problems ])
+			          , ("batch", lambda: solveBatch(calculatorClass, problems))
+			          , ("reference", lambda: [ reference(calculator, data) for calculator, data, position in problems ])
+			          ]
+			for name, method in methods:
+				outcomes = [0, 0, 0]
+				start = clock.time()
+				results = method()
+				elapsed = clock.time() - start
+				for (msg, estimate), (calculator, data, position) in zip(results, problems):
+					if msg != "ok":
+						outcomes[2] += 1
+					elif np.linalg.norm(estimate - position) > tolerance:
+						outcomes[1] += 1
+					else:
+						outcomes[0] += 1
+				print "{:>14} {:>8g} {:>10.0f} {:>10.1f} {:>10.1f} {:>10.1f}".format(name, spread, trials / elapsed,
+				                                                                 *[ 100. * o / trials for o in outcomes ])
+
+def benchAccumulation(numbers=(10, 100, 1000, 10000), windows=(0, 2), duration=1.):
+	"""Measures the size of a UPS calculator and the cost of its position calculation, against the number of beacon series
+	numbers     -- numbers of beacon series received (UPS_NUMBER)
+	windows     -- data samples kept by the calculator (CALC_WINDOW, 0 to keep all of them)
+	duration    -- approximate duration of each measurement (s)
+	"""
+	anchors = [ (0, 0, 0), (600, 0, 0), (0, 600, 0), (0, 0, -480) ]
+	position = np.array([300., 200., -100.])
+	distances = [ np.linalg.norm(position - a) for a in anchors ]
+	print "accumulation: size of a UPS calculator (bytes, pickled) and getPosition calls/s"
+	print "{:>8} {:>8} {:>12} {:>14}".format("series", "window", "size", "getPosition/s")
+	for number in numbers:
+		for window in windows:
+			calculator = UPSCalculator(Config(UPS_NUMBER = number, CALC_WINDOW = window))
+			for i, a in enumerate(anchors):
+				calculator.addAnchor(i, a)
+			for n in xrange(number):
+				time = n * calculator.config.UPS_PERIOD
+				for i in xrange(4):
+					# arrival of the beacon of each anchor, without reply delay
+					arrival = time + distances[i] / calculator.config.SND_SPEED + np.random.normal(0, 1e-4)
+					calculator.addDataPoint(i, n, (arrival, 0.))
+			count = 0
+			start = clock.time()
+			while clock.time() - start < duration:
+				calculator.getPosition()
+				count += 1
+			size = len(pickle.dumps(calculator, 2))
+			print "{:>8} {:>8} {:>12} {:>14.1f}".format(number, window, size, count / (clock.time() - start))
+
+benchmarks = {
+	"broadcast":    benchBroadcast,
+	"speed":        benchSpeed,
+	"queue":        benchQueue,
+	"memory":       benchMemory,
+	"solver":       benchSolver,
+	"accumulation": benchAccumulation,
+}
+
+if __name__ == "__main__":
+	names = sys.argv[1:] or sorted(benchmarks.keys())
+	for name in names:
+		benchmarks[name]()
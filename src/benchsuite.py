@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# scaling benchmark of the five localization protocols on test.py-like deployments of increasing size
+# usage: python benchsuite.py [-h] [--protocols ...] [--sizes ...] [--duration D] [--output FILE] [--baseline FILE] [--threshold T]
+# the results are written as JSON; when a baseline is given, the suite fails (exit code 1) if the throughput of a benchmark
+# (events processed per second) dropped by more than the threshold
+
+from montecarlo import makeScenario
+
+from multiprocessing import Pool
+import argparse
+import platform
+import resource
+import json
+import sys
+import time as clock
+
+PROTOCOLS = [ "ups", "lst", "rls", "hrls", "lsls" ]
+SIZES = [ 10, 20, 40, 80 ]     # nodes on each side of the grid: 100, 400, 1600 and 6400 nodes
+
+def runBenchmark(task):
+	"""Runs one benchmark, in a fresh worker process so that its peak memory can be measured
+	task        -- (protocol, R, duration, seed), duration being None to use the duration of the scenario
+	Returns a dictionary of measurements
+	"""
+	protocol, R, duration, seed = task
+	options = { "duration": duration } if duration is not None else {}
+	scenario = makeScenario(protocol, R, **options)
+	result = scenario.run(seed)
+	return { "protocol":       protocol
+	       , "nodes":          R * R
+	       , "seed":           seed
+	       , "simulated":      scenario.duration
+	       , "end":            result["duration"]
+	       , "wall":           result["wall"]
+	       , "events":         result["events"]
+	       , "eventsPerSecond": result["events"] / max(result["wall"], 1e-9)
+	       , "peakMemory":     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.     # MB (ru_maxrss is in kB on Linux)
+	       , "peakQueue":      result["peakQueue"]
+	       , "transmissions":  sum(result["transmissions"].values())
+	       , "localized":      sum(1 for e in result["errors"] if e == e) / float(max(1, len(result["errors"])))
+	       }
+
+def runSuite(protocols, sizes, duration = None, seed = 1):
+	"""Runs the benchmarks one after the other, each in its own process
+	protocols   -- names of the protocols (see montecarlo.scenarios)
+	sizes       -- numbers of nodes on each side of the grid
+	duration    -- simulated duration of each benchmark (s), None to use the duration of the scenarios
+	seed        -- random seed of the benchmarks
+	Returns the list of measurements (see runBenchmark)
+	"""
+	tasks = [ (protocol, R, duration, seed) for R in sizes for protocol in protocols ]
+	pool = Pool(1, maxtasksperchild = 1)    # one benchmark at a time, so they do not compete for the processor
+	results = []
+	try:
+		for result in pool.imap(runBenchmark, tasks):
+			print "{protocol:>6} {nodes:>6} nodes: {wall:9.2f} s {eventsPerSecond:10.0f} events/s {peakMemory:8.1f} MB {peakQueue:7d} in queue".format(**result)
+			sys.stdout.flush()
+			results.append(result)
+	finally:
+		pool.terminate()
+		pool.join()
+	return results
+
+def compare(results, baseline, threshold):
+	"""Compares the throughput of the benchmarks to a baseline
+	results     -- measurements of the benchmarks
+	baseline    -- measurements of the same benchmarks, taken as reference
+	threshold   -- largest acceptable relative drop of throughput (0-1)
+	Returns the list of regressions (protocol, nodes, baseline events/s, events/s)
+	"""
+	reference = dict( ((r["protocol"], r["nodes"]), r) for r in baseline )
+	regressions = []
+	for r in results:
+		old = reference.get((r["protocol"], r["nodes"]))
+		if old is None or old["simulated"] != r["simulated"]:
+			continue                    # not comparable
+		if r["eventsPerSecond"] < (1 - threshold) * old["eventsPerSecond"]:
+			regressions.append((r["protocol"], r["nodes"], old["eventsPerSecond"], r["eventsPerSecond"]))
+	return regressions
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "scaling benchmark of the localization protocols")
+	parser.add_argument("--protocols", nargs = "+", default = PROTOCOLS, choices = PROTOCOLS)
+	parser.add_argument("--sizes", nargs = "+", type = int, default = SIZES, help = "numbers of nodes on each side of the grid")
+	parser.add_argument("--duration", type = float, default = None, help = "simulated duration (s), default: that of each scenario")
+	parser.add_argument("--seed", type = int, default = 1)
+	parser.add_argument("--output", default = "benchsuite.json", help = "file receiving the results")
+	parser.add_argument("--baseline", default = None, help = "results of a previous run to compare to")
+	parser.add_argument("--threshold", type = float, default = 0.1, help = "largest acceptable drop of events/s (0-1)")
+	arguments = parser.parse_args()
+	results = runSuite(arguments.protocols, arguments.sizes, arguments.duration, arguments.seed)
+	with open(arguments.output, 'w') as f:
+		json.dump({ "date":     clock.strftime("%Y-%m-%d %H:%M:%S")
+		          , "machine":  platform.node()
+		          , "python":   platform.python_version()
+		          , "results":  results
+		          }, f, indent = 1, sort_keys = True)
+	print "results written to " + arguments.output
+	if arguments.baseline is not None:
+		with open(arguments.baseline) as f:
+			baseline = json.load(f)["results"]
+		regressions = compare(results, baseline, arguments.threshold)
+		for protocol, nodes, old, new in regressions:
+			print "REGRESSION {:>6} {:>6} nodes: {:10.0f} -> {:10.0f} events/s ({:+.1f} %)".format(protocol, nodes, old, new, 100 * (new / old - 1))
+		if len(regressions) > 0:
+			sys.exit(1)
+		print "no regression beyond %.0f %%" % (100 * arguments.threshold)
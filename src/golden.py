@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+# golden traces: records the messages and final estimates of fixed-seed scenarios, and checks that an engine reproduces them
+# usage: python golden.py record [directory]
+#        python golden.py check [directory] [--engine module.Class] [--time-tolerance T] [--tolerance R]
+#        python golden.py resume [directory] [--engine module.Class] [--split F ...]
+#        python golden.py profile [--engine module.Class]
+#        python golden.py solver
+# record the golden traces with the reference version of the engine, then check the modified version against them
+# resume checks that saving the scenarios partway (see SimEnvironment.save) and resuming them gives the results of a single run,
+# tracing them from before the save with one recorder, and after it with another
+# profile checks that profiling some scenarios measures the methods handling the states and messages of the nodes
+# solver checks that the position calculators do not locate a node found on one of its anchors, where the distances to it
+# cannot be differentiated
+# check, resume, profile and solver exit with code 1 if any scenario diverges
+
+from parameters import Config
+from montecarlo import makeScenario
+from Trace import TraceRecorder, Trace
+from SimEnvironment import load
+from PositionCalculator import TOACalculator, TDOACalculator, NOT_SOLVED, STATUS_MESSAGES
+
+import numpy as np
+import random
+import argparse
+import json
+import sys
+import os
+
+# scenarios recorded: name, protocol, R, simulated duration (s), parameters
+GOLDEN = [ ("ups",       "ups",  4,  100.,  {})
+         , ("lst",       "lst",  6,  2000., {})
+         , ("rls",       "rls",  6,  3000., {})
+         , ("rls-loss",  "rls",  6,  3000., { "SIM_LOSS": 0.1 })
+         , ("hrls",      "hrls", 6,  3000., {})
+         , ("lsls",      "lsls", 8,  1000., {})
+         ]
+SEED = 1
+# profiled scenarios: name, protocol, R, simulated duration (s), parameters, methods of the nodes that must be measured
+# (see profile), the beaconing of HRLS anchors only times out when messages are lost
+PROFILED = [ ("hrls",      "hrls", 6,  3000., {},                  [ "HRLSNode.receivePosition", "HRLSNode.tickToa" ])
+           , ("hrls-loss", "hrls", 6,  3000., { "SIM_LOSS": 0.1 }, [ "HRLSNode.tickActive", "HRLSNode.receiveRequest" ])
+           , ("lsls",      "lsls", 8,  1000., {},                  [ "LSLSNode.tickAnchor", "LSLSNode.unlocalizedBeacon" ])
+           ]
+# anchors of the solver checks, the node being on the first one
+ANCHORS = [ (0., 0., -300.), (600., 0., -250.), (0., 600., -350.), (400., 400., -100.), (-300., 200., -400.) ]
+
+def goldenScenario(protocol, R, duration, parameters, engine = None):
+	"""Creates a golden scenario
+	engine      -- class of the simulation environment, None for the default one
+	Returns the scenario
+	"""
+	scenario = makeScenario(protocol, R, Config(**parameters), duration = duration)
+	if engine is not None:
+		scenario.engine = engine
+	return scenario
+
+def record(directory, name, scenario):
+	"""Runs a scenario, recording its trace and the final estimates of its nodes
+	directory   -- directory receiving the recording
+	name        -- name of the scenario, the recording is stored in a sub-directory of this name
+	scenario    -- scenario to run
+	"""
+	path = os.path.join(directory, name)
+	trace = TraceRecorder(path)
+	result = scenario.run(SEED, trace)
+	trace.close()
+	with open(os.path.join(path, "estimates.json"), 'w') as f:
+		json.dump(result["estimates"], f)
+
+def compare(reference, candidate, timeTolerance, tolerance):
+	"""Compares two recordings
+	reference   -- directory of the reference recording
+	candidate   -- directory of the candidate recording
+	timeTolerance   -- largest acceptable difference between the dates of the events (s)
+	tolerance   -- largest acceptable relative difference between the numerical values of messages and estimates
+	Returns a list of differences, empty if the recordings are equivalent
+	"""
+	a = Trace(reference)
+	b = Trace(candidate)
+	differences = []
+	if a.nodes != b.nodes:
+		differences.append("different nodes")
+	# first event that differs: in its date, or in its other columns
+	n = min(len(a), len(b))
+	ea = a.events
+	eb = b.events
+	mismatch = np.abs(ea["time"][:n] - eb["time"][:n]) > timeTolerance
+	for column in ("sender", "receiver", "payload", "size"):
+		mismatch |= ea[column][:n] != eb[column][:n]
+	mismatch |= names(a.subjects, ea["subject"][:n]) != names(b.subjects, eb["subject"][:n])
+	# data of the messages, compared value by value
+	pa = a.payload
+	pb = b.payload
+	m = min(len(pa["value"]), len(pb["value"]))
+	va = pa["value"][:m]
+	vb = pb["value"][:m]
+	with np.errstate(invalid = 'ignore'):      # strings have nan values
+		sameValue = (np.isnan(va) & np.isnan(vb)) | (np.abs(va - vb) <= tolerance * np.maximum(1, np.abs(va)))
+	sameString = names(a.strings + ["<integer>", "<float>"], pa["string"][:m]) == names(b.strings + ["<integer>", "<float>"], pb["string"][:m])
+	wrong = np.flatnonzero(~(sameValue & sameString))
+	if len(wrong) > 0:
+		# mark the events of the first message whose data differs
+		starts = ea["payload"][:n]
+		mismatch |= (starts <= wrong[0]) & (wrong[0] < starts + ea["size"][:n])
+	if mismatch.any():
+		i = np.flatnonzero(mismatch)[0]
+		differences.append("event %d differs:\n    reference: %s (at %r s)\n    candidate: %s (at %r s)"
+		                   % (i, a.format(i), float(ea["time"][i]), b.format(i), float(eb["time"][i])))
+	elif len(a) != len(b):
+		i = n
+		extra = a if len(a) > n else b
+		differences.append("%d events in the reference, %d in the candidate, first extra event: %s" % (len(a), len(b), extra.format(i)))
+	# final estimates
+	with open(os.path.join(reference, "estimates.json")) as f:
+		estimatesA = json.load(f)
+	with open(os.path.join(candidate, "estimates.json")) as f:
+		estimatesB = json.load(f)
+	for i, (ra, rb) in enumerate(zip(estimatesA, estimatesB)):
+		if (ra is None) != (rb is None) or (ra is not None and
+		   np.max(np.abs(np.array(ra) - np.array(rb))) > tolerance * max(1, np.max(np.abs(ra)))):
+			differences.append("node %d estimate differs: %s in the reference, %s in the candidate" % (i, ra, rb))
+			break
+	if len(estimatesA) != len(estimatesB):
+		differences.append("%d estimates in the reference, %d in the candidate" % (len(estimatesA), len(estimatesB)))
+	return differences
+
+def resume(scenario, split, directory):
+	"""Runs a scenario in three parts: until half the split date, then traced until the split date,
+	then from the simulation saved at that date and loaded back, traced by another recorder
+	The outputs of the nodes are silenced
+	scenario    -- scenario to run
+	split       -- date at which the simulation is saved (s)
+	directory   -- directory receiving the saved simulation and the traces
+	Returns the final estimates of the nodes and the number of messages broadcast for each subject, as Scenario.run,
+	and the differences found in the traces
+	"""
+	random.seed(SEED)
+	np.random.seed(SEED)
+	sim, evaluated = scenario.build()
+	path = os.path.join(directory, "resume.pickle")
+	traces = [ TraceRecorder(os.path.join(directory, name)) for name in ("resume-before", "resume-after") ]
+	counts = []
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')
+	try:
+		sim.run(split / 2)
+		counts.append(transmitted(sim))
+		sim.run(split, trace = traces[0])
+		counts.append(transmitted(sim))
+		sim.save(path)
+		sim = load(path)
+		sim.run(scenario.duration, trace = traces[1])
+		counts.append(transmitted(sim))
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+	differences = []
+	for i, trace in enumerate(traces):
+		trace.close()
+		differences += checkTrace(trace.path, counts[i+1] - counts[i])
+	estimates = [ node.estimate() for node in sim.nodes ]
+	subjects = sim.statistics()["subjects"]
+	return ( [ tuple(float(x) for x in e) if e is not None else None for e in estimates ]
+	       , dict( (s, c["transmissions"]) for s, c in subjects.iteritems() )
+	       , differences )
+
+def transmitted(sim):
+	"""Returns the number of messages broadcast since the creation of a simulation environment"""
+	return sum( c["transmissions"] for c in sim.statistics()["subjects"].itervalues() )
+
+def checkTrace(path, transmissions):
+	"""Checks a trace recorded during part of a run: its transmissions, and that it only records the receptions of these
+	path        -- directory of the trace
+	transmissions   -- number of messages broadcast during the run
+	Returns a list of differences, empty if the trace is consistent
+	"""
+	trace = Trace(path)
+	events = trace.events
+	sent = trace.transmissions()
+	differences = []
+	if np.count_nonzero(sent) != transmissions:
+		differences.append("%s: %d transmissions recorded, %d broadcast" % (path, np.count_nonzero(sent), transmissions))
+	keys = zip(events["sender"], events["subject"], events["payload"], events["size"])
+	recorded = set( key for key, s in zip(keys, sent) if s )
+	foreign = sum( 1 for key, s in zip(keys, sent) if not s and key not in recorded )
+	if foreign > 0:
+		differences.append("%s: %d receptions of messages not recorded" % (path, foreign))
+	return differences
+
+def compareResumed(scenario, split, directory):
+	"""Compares a scenario resumed from a saved simulation to a single run of it (see resume)
+	Returns a list of differences, empty if the results are identical
+	"""
+	result = scenario.run(SEED)
+	estimates, transmissions, differences = resume(scenario, split, directory)
+	if transmissions != result["transmissions"]:
+		differences.append("transmissions: %s in a single run, %s resumed" % (result["transmissions"], transmissions))
+	for i, (a, b) in enumerate(zip(result["estimates"], estimates)):
+		if a != b:
+			differences.append("node %d estimate differs: %s in a single run, %s resumed" % (i, a, b))
+			break
+	return differences
+
+def profile(scenario, labels):
+	"""Runs a scenario with the profiler attached (see SimEnvironment.run), its outputs and report being silenced
+	scenario    -- scenario to run
+	labels      -- measurements expected in the profile, e.g. HRLSNode.tickActive
+	Returns a list of differences, empty if every measurement expected has calls
+	"""
+	random.seed(SEED)
+	np.random.seed(SEED)
+	sim, evaluated = scenario.build()
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')
+	try:
+		sim.run(scenario.duration, profile = True)
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+	return [ "%s: not measured" % label for label in labels if sim.profiler.stats.get(label, [0])[0] == 0 ]
+
+def solveOnAnchor(calculatorClass):
+	"""Locates a node from the exact distances to its anchors, starting from the position of the anchor it is on
+	problem by problem, and in a batch with a node starting from elsewhere
+	calculatorClass -- TOACalculator or TDOACalculator
+	Returns a list of differences, empty if the node on an anchor is reported as not solved, and the other one is located
+	"""
+	anchors = np.array(ANCHORS)
+	position = anchors[0]
+	dist = np.sqrt(((anchors - position)**2).sum(axis=1))
+	data = dist if calculatorClass is TOACalculator else dist[-1] - dist[:-1]
+	calculator = calculatorClass(position)
+	for i, p in enumerate(ANCHORS):
+		calculator.addAnchor(i, p)
+	differences = []
+	with np.errstate(invalid = 'ignore', divide = 'ignore'):
+		msg, estimate = calculator.calculate(data)
+		status, estimates = calculatorClass.calculateBatch(np.array([ANCHORS, ANCHORS]), np.array([data, data]), calculator.config,
+		                                                   np.array([position, position + 20.]))
+	if msg != STATUS_MESSAGES[NOT_SOLVED]:
+		differences.append("%s.calculate: %s at %s" % (calculatorClass.__name__, msg, estimate))
+	if status[0] != NOT_SOLVED:
+		differences.append("%s.calculateBatch: %s at %s" % (calculatorClass.__name__, STATUS_MESSAGES[status[0]], estimates[0]))
+	if STATUS_MESSAGES[status[1]] != "ok" or np.linalg.norm(estimates[1] - position) > 1e-3:
+		differences.append("%s.calculateBatch, other node: %s at %s" % (calculatorClass.__name__, STATUS_MESSAGES[status[1]], estimates[1]))
+	return differences
+
+def names(table, codes):
+	"""Translates codes into the strings they stand for
+	table       -- string of each code, negative codes counting from the end
+	codes       -- array of codes
+	Returns an array of strings
+	"""
+	return np.array(table, dtype=object)[codes]
+
+def loadEngine(name):
+	"""Imports a simulation environment class
+	name        -- module and class, e.g. SimEnvironment.SimEnvironment
+	Returns the class
+	"""
+	module, className = name.rsplit(".", 1)
+	return getattr(__import__(module), className)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "golden traces of the simulation engine")
+	parser.add_argument("action", choices = ["record", "check", "resume", "profile", "solver"])
+	parser.add_argument("directory", nargs = "?", default = "golden")
+	parser.add_argument("--engine", default = None, help = "class of the candidate engine, e.g. SimEnvironment.SimEnvironment")
+	parser.add_argument("--time-tolerance", type = float, default = 1e-9, help = "largest difference between dates (s)")
+	parser.add_argument("--tolerance", type = float, default = 1e-9, help = "largest relative difference between values")
+	parser.add_argument("--split", nargs = "+", type = float, default = [0.3, 0.6],
+	                    help = "dates at which resume saves the scenarios, as fractions of their duration")
+	arguments = parser.parse_args()
+	engine = loadEngine(arguments.engine) if arguments.engine is not None else None
+	if arguments.action == "record":
+		for name, protocol, R, duration, parameters in GOLDEN:
+			record(arguments.directory, name, goldenScenario(protocol, R, duration, parameters, engine))
+			print "recorded " + name
+		sys.exit(0)
+	failed = False
+	if arguments.action == "resume":
+		for name, protocol, R, duration, parameters in GOLDEN:
+			for fraction in arguments.split:
+				split = fraction * duration
+				differences = compareResumed(goldenScenario(protocol, R, duration, parameters, engine), split, arguments.directory)
+				print "{:10} saved at {:8.2f} s: {}".format(name, split, "ok" if len(differences) == 0 else "DIVERGES")
+				for d in differences:
+					print "    " + d
+				failed = failed or len(differences) > 0
+		sys.exit(1 if failed else 0)
+	if arguments.action == "profile":
+		for name, protocol, R, duration, parameters, labels in PROFILED:
+			differences = profile(goldenScenario(protocol, R, duration, parameters, engine), labels)
+			print "{:10} {}".format(name, "ok" if len(differences) == 0 else "NOT MEASURED")
+			for d in differences:
+				print "    " + d
+			failed = failed or len(differences) > 0
+		sys.exit(1 if failed else 0)
+	if arguments.action == "solver":
+		for calculatorClass in (TOACalculator, TDOACalculator):
+			differences = solveOnAnchor(calculatorClass)
+			print "{:14} {}".format(calculatorClass.__name__, "ok" if len(differences) == 0 else "LOCATED ON AN ANCHOR")
+			for d in differences:
+				print "    " + d
+			failed = failed or len(differences) > 0
+		sys.exit(1 if failed else 0)
+	for name, protocol, R, duration, parameters in GOLDEN:
+		candidate = os.path.join(arguments.directory, "candidate")
+		record(candidate, name, goldenScenario(protocol, R, duration, parameters, engine))
+		differences = compare(os.path.join(arguments.directory, name), os.path.join(candidate, name),
+		                      arguments.time_tolerance, arguments.tolerance)
+		print "{:10} {}".format(name, "ok" if len(differences) == 0 else "DIVERGES")
+		for d in differences:
+			print "    " + d
+		failed = failed or len(differences) > 0
+	sys.exit(1 if failed else 0)
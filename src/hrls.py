@@ -1,16 +1,29 @@
 #!/usr/bin/env python
 
-from parameters import *
 from SimEnvironment import SimEnvironment, distance
-from UWNode import UWNode
+from UWNode import UWNode, UNLOCALIZED, LOCALIZED, ANCHOR, CATEGORIES
+from Message import Message
 from PositionCalculator import UPSCalculator, TOACalculator
 
 import numpy as np
 from heapq import heappush, heappop
 from itertools import combinations
 
+# secondary status of the nodes, the primary status being their category (UNLOCALIZED, LOCALIZED or ANCHOR)
+INIT = 0            # ANCHOR: initial anchor, waiting for a time slot to announce itself
+IDLE = 1            # UNLOCALIZED: listening to the neighbors
+REQUESTING = 2      # UNLOCALIZED: requesting its best anchor set in its next time slot
+NEW = 3             # LOCALIZED: waiting for a time slot to broadcast the position
+READY = 4           # LOCALIZED, ANCHOR: may be requested as an anchor
+CONFIRMING = 5      # LOCALIZED, ANCHOR: requested, waiting for the sub-anchors to announce themselves
+TOA = 6             # LOCALIZED: refining its position by TOA before becoming an anchor
+ACTIVE = 7          # ANCHOR: beaconing
+STATUS_NAMES = ["init", "idle", "requesting", "new", "ready", "confirming", "toa", "active"]
+
 class HRLSNode(UWNode):
 	"""Node class implementing the "reactive localization scheme"""
+	__slots__ = ("status", "timestamp", "slotTimer", "neighbors", "calculator", "bestAnchors", "positionEstimates",
+	             "subAnchors", "anchorLevel", "anchorMaster", "beaconCount")
 	
 	slotNumber = 0  # number of time slots in a full cycle
 	
@@ -23,7 +36,9 @@ class HRLSNode(UWNode):
 		name = "node-" + str(id)
 		UWNode.__init__(self, name, position)
 		# common attributes
-		self.status = ["ANCHOR", "init"] if localized else ["UNLOCALIZED", "idle"]  # primary and secondary status of the node
+		self.status = INIT if localized else IDLE   # secondary status of the node, see STATUS_NAMES
+		if localized:
+			self.setCategory(ANCHOR)
 		self.timestamp = 0              # multipurpose time stamp, meaning depends on current state (unit: s)
 		                                # UNLOCALIZED: silence after certain messages
 		                                # /confirming, ANCHOR/active: timeout
@@ -47,230 +62,258 @@ class HRLSNode(UWNode):
 	
 	def tick(self, time):
 		"""Function called every tick, lets the node perform operations
+		The node acts according to its secondary status, see TICK_HANDLERS
 		time        -- date of polling (s)
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
-		
-		if time / RLS_TIMESLOT > self.slotTimer:
+	
+		if time / self.config.RLS_TIMESLOT > self.slotTimer:
 			self.slotTimer += HRLSNode.slotNumber
 			timeslotOpen = True
-			# print self.name, self.status[0] + "/" + self.status[1]
+			# print self.name, "/".join(self.statusNames())
 		else:
 			timeslotOpen = False
-		
-		if self.status[0] == "UNLOCALIZED":
-			if self.status[1] == "idle":
-				if timeslotOpen and len(self.bestAnchors) > 0:
-					self.status[1] = "requesting"
-					self.timestamp = time + 2*RLS_TIMESLOT
-			
-			elif self.status[1] == "requesting":
-				if timeslotOpen and time > self.timestamp:
-					self.status[1] = "idle"
-					s, n0, n1, n2, n3 = heappop(self.bestAnchors)
-					return self.name + " request " + " ".join([n0, n1, n2, n3])
-		
-		elif self.status[0] == "LOCALIZED":
-			if self.status[1] == "new":
-				if timeslotOpen and time > self.timestamp:
-					self.status[1] = "ready"
-					x, y, z = self.getPosition()
-					return self.name + " position " + str(x) + " " + str(y) + " " + str(z)
-			
-			elif self.status[1] == "confirming":
-				if time > self.timestamp:
-					print self.name, self.status, "timeout", self.timestamp
-					self.status[1] = "ready"
-			
-			elif self.status[1] == "toa":
-				if time > self.timestamp + 2*RLS_TIMESLOT:
-					msg, position = self.calculator.getPosition()
-					if msg == "ok":
-						print self.name, msg, position, distance(position, self.position)
-						self.status = ["ANCHOR", "confirming"]
-						self.timestamp = time + RLS_TIMESLOT
-						self.positionEstimates = [position]
-						x, y, z = position
-						return self.name + " anchor " + " " + str(x) + " " + str(y) + " " + str(z)
-					else:
-						self.status[1] = "ready"
-		
-		elif self.status[0] == "ANCHOR":
-			if self.status[1] == "confirming":
-				if time > self.timestamp:
-					print self.name, self.status, "timeout", self.timestamp
-					self.status[1] = "ready"
-			
-			elif self.status[1] == "active":
-				if time > self.timestamp:
-					print self.name, self.status, "timeout", self.timestamp
-					self.status[1] = "ready"
-			
-			elif self.status[1] == "init":
-				if timeslotOpen:
-					self.status[1] = "ready"
-					x, y, z = self.getPosition()
-					return self.name + " anchor " + str(x) + " " + str(y) + " " + str(z)
-		
-		if self.status[1] == "confirming":
-			# similar behavior regardless of primary status
-			if len(self.subAnchors) == 0:
-				if self.status[0] == "ANCHOR":
-					self.status[1] = "active"
-					if self.anchorLevel == 0:
-						return self.name + " beacon 0 1 0"
-				else:
-					self.status[1] = "toa"
-					self.calculator = TOACalculator(self.getPosition())
-					self.timestamp = time
-					return self.name + " ping"
-			elif time > self.timestamp:
-				print self.name, self.status, "timeout", self.timestamp
-				self.status[1] = "ready"
-			
-		
-		return ""
+	
+		handler = TICK_HANDLERS[self.status]
+		if handler is None:
+			return None
+		return getattr(self, handler)(time, timeslotOpen)
+	
+	def tickInit(self, time, timeslotOpen):
+		# ANCHOR/init: announce the position in the first time slot
+		if timeslotOpen:
+			self.status = READY
+			x, y, z = self.getPosition()
+			return Message(self.name, "anchor", (float(x), float(y), float(z)))
+		return None
+	
+	def tickIdle(self, time, timeslotOpen):
+		# UNLOCALIZED/idle: request the best anchor set in the next time slot
+		if timeslotOpen and len(self.bestAnchors) > 0:
+			self.status = REQUESTING
+			self.timestamp = time + 2*self.config.RLS_TIMESLOT
+		return None
+	
+	def tickRequesting(self, time, timeslotOpen):
+		if timeslotOpen and time > self.timestamp:
+			self.status = IDLE
+			s, n0, n1, n2, n3 = heappop(self.bestAnchors)
+			return Message(self.name, "request", (n0, n1, n2, n3))
+		return None
+	
+	def tickNew(self, time, timeslotOpen):
+		# LOCALIZED/new: broadcast the position in the next time slot
+		if timeslotOpen and time > self.timestamp:
+			self.status = READY
+			x, y, z = self.getPosition()
+			return Message(self.name, "position", (float(x), float(y), float(z)))
+		return None
+	
+	def tickConfirming(self, time, timeslotOpen):
+		# similar behavior regardless of primary status
+		if time > self.timestamp:
+			print self.name, self.statusNames(), "timeout", self.timestamp
+			self.status = READY
+			return None
+		if len(self.subAnchors) == 0:
+			if self.category == ANCHOR:
+				self.status = ACTIVE
+				if self.anchorLevel == 0:
+					return Message(self.name, "beacon", (0, 1, 0.))
+			else:
+				self.status = TOA
+				self.calculator = TOACalculator(self.getPosition(), self.config)
+				self.timestamp = time
+				return Message(self.name, "ping", ())
+		return None
+	
+	def tickToa(self, time, timeslotOpen):
+		# LOCALIZED/toa: calculate the position once the anchors had time to answer, and become an anchor
+		if time > self.timestamp + 2*self.config.RLS_TIMESLOT:
+			msg, position = self.calculator.getPosition()
+			if msg == "ok":
+				print self.name, msg, position, distance(position, self.position)
+				self.status = CONFIRMING
+				self.setCategory(ANCHOR)
+				self.timestamp = time + self.config.RLS_TIMESLOT
+				self.positionEstimates = [position]
+				x, y, z = position
+				return Message(self.name, "anchor", (float(x), float(y), float(z)))
+			else:
+				self.status = READY
+		return None
+	
+	def tickActive(self, time, timeslotOpen):
+		# ANCHOR/active: timeout of the beaconing
+		if time > self.timestamp:
+			print self.name, self.statusNames(), "timeout", self.timestamp
+			self.status = READY
+		return None
 	
 	def receive(self, time, message):
 		"""Function called when a message broadcast by another node arrives at the node
+		The node handles the message according to its subject, see RECEIVE_HANDLERS
 		time        -- date of reception (s)
 		message     -- message received
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
-		words = message.split()
-		sender = words[0]
-		subject = words[1]
-		data = words[2:]
-		
-		if subject == "position":
-			# ALL: register the neighbor
-			# UNLOCALIZED: find new anchor sets
-			x = float(data[0])
-			y = float(data[1])
-			z = float(data[2])
-			position = np.array([x, y, z])
-			# add to the list of neighbor
-			self.neighbors[sender] = (False, position)
-			# if node is unlocalized, attempt to find a better anchor set, and revert to "idle" status
-			if self.status[0] == "UNLOCALIZED":
-				self.findAnchors(sender, position)
-				self.status[1] = "idle"
-		
-		if subject == "anchor":
-			# ALL: register the neighbor
-			# UNLOCALIZED: update anchor ratings
-			# confirming: remove from the list of sub-anchors, if applicable
-			x = float(data[0])
-			y = float(data[1])
-			z = float(data[2])
-			position = np.array([x, y, z])
-			# add to the list of neighbor
-			self.neighbors[sender] = (True, position)
-			# if node is unlocalized, attempt to find a better anchor set, and revert to "idle" status
-			if self.status[0] == "UNLOCALIZED":
-				self.findAnchors(sender, position)
-				self.status[1] = "idle"
-			# remove from sub-anchors
-			while sender in self.subAnchors:
-				self.subAnchors.remove(sender)
-		
-		if subject == "request":
-			# silence timer
-			if self.status[0] == "UNLOCALIZED" or self.status[1] == "new":
-				self.timestamp = time + 2*RLS_TIMESLOT
-			# /ready, concerned: transition to /confirming
-			# if level 0: transition to next state
-			if self.status[1] == "ready" and self.name in data:
-				for node in data:
-					if node not in self.neighbors and node != self.name:
-						return ""
-				i = data.index(self.name)
-				self.subAnchors =  [ node for node in data[i+1:] if not self.neighbors[node][0] ]
-				self.anchorLevel = i
-				self.anchorMaster = data[(i-1) % 4]
-				self.status[1] = "confirming"
-				self.timestamp = time + RLS_TIMESLOT
-				self.beaconCount = 1
-		
-		if subject == "ping":
-			# silence & timeout
-			if self.status[0] == "UNLOCALIZED" or self.status[1] == "new":
-				self.timestamp = time + 2*RLS_TIMESLOT
-			if self.status[1] == "confirming" or self.status[1] == "active":
-				self.timestamp = time + 3*RLS_TIMESLOT
-			# if ANCHOR: send "ack"
-			if self.status[0] == "ANCHOR":
-				return self.name + " ack " + sender + " " + str(SIM_TICK)
-		
-		if subject == "ack":
-			# silence timer
-			if self.status[0] == "UNLOCALIZED" or self.status[1] == "new":
-				self.timestamp = time + 2*RLS_TIMESLOT
-			# if concerned: register TOA data
-			recipient = data[0]
-			delay = float(data[1])
-			if self.status[1] == "toa":
-				if self.name == recipient:
-					self.calculator.addAnchor(sender, self.neighbors[sender][1])
-					self.calculator.addDataPoint(sender, 0, (time - self.timestamp, delay))
-		
-		if subject == "beacon":
-			# silence & timeout
-			if self.status[0] == "UNLOCALIZED":
-				self.status[1] = "idle"
-			if self.status[1] == "new":
-				self.timestamp = time + 2*RLS_TIMESLOT
-			if self.status[1] == "active":
-				self.timestamp = time + 2*RLS_TIMESLOT
-			# not ANCHOR: register TDOA data
-			# ANCHOR/active, concerned: send "beacon"
-			level = int(data[0])
-			count = int(data[1])
-			delay = float(data[2])
-			if self.status == ["ANCHOR", "active"]:
-				# check if concerned
-				if sender != self.anchorMaster:
-					return ""
-				if (level+1)%4 != self.anchorLevel:
-					# should not happen!
-					self.status[1] = "ready"
-					return ""
-				if self.anchorLevel == 0:
-					self.beaconCount += 1
-					newDelay = 0
-				else:
-					self.beaconCount = count
-					timeToMaster = distance(self.getPosition(), self.neighbors[sender][1]) / SND_SPEED
-					newDelay = delay + timeToMaster + SIM_TICK
-				if self.beaconCount == UPS_NUMBER:
-					self.status[1] = "ready"
-				return self.name + " beacon " + str(self.anchorLevel) + " " + str(self.beaconCount) + " " + str(newDelay)
-			elif self.status[0] != "ANCHOR" and self.status[1] not in ["confirming", "toa"]:
-				if count == 1 and level == 0:
-					self.calculator = UPSCalculator()
-				elif self.calculator is None:
-					return ""
-				if count == 1 and len(self.calculator.anchors) == level and sender not in self.calculator.anchors:
-					self.calculator.addAnchor(sender, self.neighbors[sender][1])
-				elif len(self.calculator.anchors) < 4:
-					self.calculator = None
-					return ""
-				if sender != self.calculator.anchors[level]:
-					return ""
-				# register data
-				self.calculator.addDataPoint(sender, count, (time, delay))
-				# if finished, do calculation
-				if level == 3 and count == UPS_NUMBER:
-					msg, position = self.calculator.getPosition()
-					print self.name, msg, position, distance(position, self.position)
-					if msg == "ok":
-						self.positionEstimates.append(position)
-						if self.status[0] == "UNLOCALIZED":
-							self.status = ["LOCALIZED", "new"]
-					self.calculator = None
-		
-		return ""
-					
+		sender, subject, data = message
+		handler = RECEIVE_HANDLERS.get(subject)
+		if handler is None:
+			return None
+		return getattr(self, handler)(time, sender, data)
+	
+	def receivePosition(self, time, sender, data):
+		# ALL: register the neighbor
+		# UNLOCALIZED: find new anchor sets
+		position = np.array(data)
+		# add to the list of neighbor
+		self.neighbors[sender] = (False, position)
+		# if node is unlocalized, attempt to find a better anchor set, and revert to "idle" status
+		if self.category == UNLOCALIZED:
+			self.findAnchors(sender, position)
+			self.status = IDLE
+		return None
+	
+	def receiveAnchor(self, time, sender, data):
+		# ALL: register the neighbor
+		# UNLOCALIZED: update anchor ratings
+		# confirming: remove from the list of sub-anchors, if applicable
+		position = np.array(data)
+		# add to the list of neighbor
+		self.neighbors[sender] = (True, position)
+		# if node is unlocalized, attempt to find a better anchor set, and revert to "idle" status
+		if self.category == UNLOCALIZED:
+			self.findAnchors(sender, position)
+			self.status = IDLE
+		# remove from sub-anchors
+		while sender in self.subAnchors:
+			self.subAnchors.remove(sender)
+		return None
+	
+	def receiveRequest(self, time, sender, data):
+		# silence timer
+		if self.category == UNLOCALIZED or self.status == NEW:
+			self.timestamp = time + 2*self.config.RLS_TIMESLOT
+		# /ready, concerned: transition to /confirming
+		# if level 0: transition to next state
+		if self.status == READY and self.name in data:
+			for node in data:
+				if node not in self.neighbors and node != self.name:
+					return None
+			i = data.index(self.name)
+			self.subAnchors =  [ node for node in data[i+1:] if not self.neighbors[node][0] ]
+			self.anchorLevel = i
+			self.anchorMaster = data[(i-1) % 4]
+			self.status = CONFIRMING
+			self.timestamp = time + self.config.RLS_TIMESLOT
+			self.beaconCount = 1
+		return None
+	
+	def receivePing(self, time, sender, data):
+		# silence & timeout
+		if self.category == UNLOCALIZED or self.status == NEW:
+			self.timestamp = time + 2*self.config.RLS_TIMESLOT
+		if self.status == CONFIRMING or self.status == ACTIVE:
+			self.timestamp = time + 3*self.config.RLS_TIMESLOT
+		# if ANCHOR: send "ack"
+		if self.category == ANCHOR:
+			return Message(self.name, "ack", (sender, self.config.SIM_TICK))
+		return None
+	
+	def receiveAck(self, time, sender, data):
+		# silence timer
+		if self.category == UNLOCALIZED or self.status == NEW:
+			self.timestamp = time + 2*self.config.RLS_TIMESLOT
+		# if concerned: register TOA data
+		recipient, delay = data
+		if self.status == TOA:
+			if self.name == recipient:
+				self.calculator.addAnchor(sender, self.neighbors[sender][1])
+				self.calculator.addDataPoint(sender, 0, (time - self.timestamp, delay))
+		return None
+	
+	def receiveBeacon(self, time, sender, data):
+		# silence & timeout
+		if self.category == UNLOCALIZED:
+			self.status = IDLE
+		if self.status == NEW:
+			self.timestamp = time + 2*self.config.RLS_TIMESLOT
+		if self.status == ACTIVE:
+			self.timestamp = time + 2*self.config.RLS_TIMESLOT
+		# not ANCHOR: register TDOA data
+		# ANCHOR/active, concerned: send "beacon"
+		level, count, delay = data
+		if self.category == ANCHOR and self.status == ACTIVE:
+			# check if concerned
+			if sender != self.anchorMaster:
+				return None
+			if (level+1)%4 != self.anchorLevel:
+				# should not happen!
+				self.status = READY
+				return None
+			if self.anchorLevel == 0:
+				self.beaconCount += 1
+				newDelay = 0
+			else:
+				self.beaconCount = count
+				timeToMaster = distance(self.getPosition(), self.neighbors[sender][1]) / self.config.SND_SPEED
+				newDelay = delay + timeToMaster + self.config.SIM_TICK
+			if self.beaconCount == self.config.UPS_NUMBER:
+				self.status = READY
+			return Message(self.name, "beacon", (self.anchorLevel, self.beaconCount, newDelay))
+		elif self.category != ANCHOR and self.status not in (CONFIRMING, TOA):
+			if count == 1 and level == 0:
+				self.calculator = UPSCalculator(self.config)
+			elif self.calculator is None:
+				return None
+			if count == 1 and len(self.calculator.anchors) == level and sender not in self.calculator.anchors:
+				self.calculator.addAnchor(sender, self.neighbors[sender][1])
+			elif len(self.calculator.anchors) < 4:
+				self.calculator = None
+				return None
+			if sender != self.calculator.anchors[level]:
+				return None
+			# register data
+			self.calculator.addDataPoint(sender, count, (time, delay))
+			# if finished, do calculation
+			if level == 3 and count == self.config.UPS_NUMBER:
+				msg, position = self.calculator.getPosition()
+				print self.name, msg, position, distance(position, self.position)
+				if msg == "ok":
+					self.positionEstimates.append(position)
+					if self.category == UNLOCALIZED:
+						self.status = NEW
+						self.setCategory(LOCALIZED)
+				self.calculator = None
+		return None
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		Returns the date from which the node must be ticked again (s), or inf if the node is dormant until it receives a message
+		"""
+		if self.status == READY:
+			return float('inf')     # the time slots are not used anymore once a node has been ready
+		elif self.status == CONFIRMING:
+			return time if len(self.subAnchors) == 0 else self.timestamp
+		elif self.status == ACTIVE:
+			return self.timestamp
+		elif self.status == TOA:
+			return self.timestamp + 2*self.config.RLS_TIMESLOT
+		else:
+			return self.slotTimer * self.config.RLS_TIMESLOT    # idle, requesting, new, init: waiting for a time slot
+	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		The estimate is the average of the positions calculated so far
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
+		"""
+		return self.getPosition() if len(self.positionEstimates) > 0 else None
+	
+	def statusNames(self):
+		"""Returns the names of the primary and secondary status of the node, e.g. ["UNLOCALIZED", "idle"]"""
+		return [CATEGORIES[self.category], STATUS_NAMES[self.status]]
 	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot
@@ -281,7 +324,7 @@ class HRLSNode(UWNode):
 			"UNLOCALIZED": ("black",  'v'),
 			"LOCALIZED": ("cyan", '^'),
 			"ANCHOR": ("blue",  '^')
-		}[self.status[0]]
+		}[CATEGORIES[self.category]]
 		plot.scatter(x, y, z, c=color, marker=mark, lw=0)
 		if len(self.positionEstimates) > 0:
 			ex, ey, ez = self.getPosition()
@@ -294,7 +337,7 @@ class HRLSNode(UWNode):
 		self.bestAnchors = []
 		l = len(self.neighbors)
 		if l >= 4:
-			for n0, n1, n2, n3 in combinations(self.neighbors.keys(), 4):
+			for n0, n1, n2, n3 in combinations(sorted(self.neighbors), 4):
 				s = self.rateAnchors([n0, n1, n2, n3])
 				if s > 0:
 					heappush(self.bestAnchors, (-s, n0, n1, n2, n3))
@@ -307,13 +350,13 @@ class HRLSNode(UWNode):
 		for n1 in positions:
 			for n2 in positions:
 				d = np.linalg.norm(n1-n2)
-				if d > SIM_RANGE:
+				if d > self.config.SIM_RANGE:
 					return 0
 				else:
 					avgDist += d
 		avgDist /= 12
 		# calculate the score
-		sizeRating = min(avgDist, SIM_RANGE/2)
+		sizeRating = min(avgDist, self.config.SIM_RANGE/2)
 		a = positions[1] - positions[0]
 		b = positions[2] - positions[0]
 		c = positions[3] - positions[0]
@@ -324,4 +367,23 @@ class HRLSNode(UWNode):
 	def getPosition(self):
 		# average the estimates
 		return sum(self.positionEstimates) / len(self.positionEstimates)
-	
\ No newline at end of file
+
+# behavior of the nodes on each tick, by secondary status: names of the methods called (None: nothing to do)
+# the methods are looked up on the node when called, so that they can be replaced (e.g. by the profiler)
+TICK_HANDLERS = [ "tickInit"                # INIT
+                , "tickIdle"                # IDLE
+                , "tickRequesting"          # REQUESTING
+                , "tickNew"                 # NEW
+                , None                      # READY
+                , "tickConfirming"          # CONFIRMING
+                , "tickToa"                 # TOA
+                , "tickActive"              # ACTIVE
+                ]
+# handling of the messages received, by subject: names of the methods called
+RECEIVE_HANDLERS = { "position":   "receivePosition"
+                   , "anchor":     "receiveAnchor"
+                   , "request":    "receiveRequest"
+                   , "ping":       "receivePing"
+                   , "ack":        "receiveAck"
+                   , "beacon":     "receiveBeacon"
+                   }
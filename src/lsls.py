@@ -1,12 +1,21 @@
 #!/usr/bin/env python
 
-from parameters import *
 from SimEnvironment import SimEnvironment, distance
-from UWNode import UWNode
+from UWNode import UWNode, LOCALIZED as LOCALIZED_CATEGORY, ANCHOR as ANCHOR_CATEGORY
+from Message import Message
 from PositionCalculator import UPSCalculator
 
 import numpy as np
 
+# status of the nodes
+UNLOCALIZED = 0     # collecting chains of anchors
+LISTENING = 1       # recording the beacons of a complete chain of anchors
+LOCALIZED = 2       # localized, may become candidate to the next chain of anchors
+CANDIDATE = 3       # candidate to a chain of anchors, waiting for its timer
+CONFIRMING = 4      # confirming its candidacy, waiting for concurrent candidates
+ANCHOR = 5          # anchor of a chain, beaconing
+STATUS_NAMES = ["UNLOCALIZED", "LISTENING", "LOCALIZED", "CANDIDATE", "CONFIRMING", "ANCHOR"]
+
 class LSLSNode(UWNode):
 	"""All-purpose node localizing itself using the LSLS scheme"""
 	def __init__(self, id, position = (-1,-1,0), localized = False):
@@ -24,194 +33,190 @@ class LSLSNode(UWNode):
 		if localized:
 			self.positionEstimate = position
 			# self.errorEstimate = 0
-			self.status = "LOCALIZED"
+			self.status = LOCALIZED        # see STATUS_NAMES
+			self.setCategory(LOCALIZED_CATEGORY)
 			self.level = 1
 		else:
 			self.positionEstimate = None
 			# self.errorEstimate = -1
-			self.status = "UNLOCALIZED"
+			self.status = UNLOCALIZED
 			self.level = 0
 	
 	def tick(self, time):
 		"""Function called every tick, lets the node perform operations
+		The node acts when its timer expires, according to its status, see TICK_HANDLERS
 		time        -- date of polling (s)
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
-		subject = ""
-		data = []
 		if time > self.timer:
-			if self.status == "UNLOCALIZED":
-				pass
-			elif self.status == "LISTENING":
-				pass
-			elif self.status == "LOCALIZED":
-				pass
-			elif self.status == "CANDIDATE":
-				self.status = "CONFIRMING"
-				self.timer = time + 2 * self.standardTimer()
-				subject = "confirm"
-				parent, d = self.master
-				data = [self.level, self.candidateTimer(d), parent]
-			elif self.status == "CONFIRMING":
-				self.status = "ANCHOR"
-				self.timer = float('inf') if self.level > 0 else time + (3 * LSLS_WAITFACTOR + 10) * self.standardTimer()
-				subject = "anchor"
-				parent, d = self.master
-				x, y, z = self.positionEstimate
-				data = [self.level, x, y, z, parent]
-			elif self.status == "ANCHOR":
-				subject = "beacon"
-				data = [self.beaconCount, self.level, time - self.timer]
-				if self.beaconCount == UPS_NUMBER - 1:
-					self.status = "LOCALIZED"
-					self.level = 1
-					self.timer = float('inf')
-				elif self.level == 0:
-					self.beaconCount += 1
-					self.timer += UPS_PERIOD
-				else:
-					self.timer = float('inf')
-		if len(subject) > 0:
-			return " ".join([self.name, subject] + [ str(e) for e in data ])
+			handler = TICK_HANDLERS[self.status]
+			if handler is not None:
+				return getattr(self, handler)(time)
+		return None
+	
+	def tickCandidate(self, time):
+		# CANDIDATE node not outrun by another candidate: confirms its election
+		self.status = CONFIRMING
+		self.timer = time + 2 * self.standardTimer()
+		parent, d = self.master
+		return Message(self.name, "confirm", (self.level, self.candidateTimer(d), parent))
+	
+	def tickConfirming(self, time):
+		# CONFIRMING node not outrun by another candidate: becomes anchor
+		self.status = ANCHOR
+		self.setCategory(ANCHOR_CATEGORY)
+		self.timer = float('inf') if self.level > 0 else time + (3 * self.config.LSLS_WAITFACTOR + 10) * self.standardTimer()
+		parent, d = self.master
+		x, y, z = self.positionEstimate
+		return Message(self.name, "anchor", (self.level, float(x), float(y), float(z), parent))
+	
+	def tickAnchor(self, time):
+		# ANCHOR node: beacons, the master anchor every UPS_PERIOD, the others when their master's beacon arrives
+		message = Message(self.name, "beacon", (self.beaconCount, self.level, time - self.timer))
+		if self.beaconCount == self.config.UPS_NUMBER - 1:
+			self.status = LOCALIZED
+			self.setCategory(LOCALIZED_CATEGORY)
+			self.level = 1
+			self.timer = float('inf')
+		elif self.level == 0:
+			self.beaconCount += 1
+			self.timer += self.config.UPS_PERIOD
 		else:
-			return ""
+			self.timer = float('inf')
+		return message
 	
 	def receive(self, time, message):
 		"""Function called when a message broadcast by another node arrives at the node
+		The node handles the message according to its subject and its status, see RECEIVE_HANDLERS
 		time        -- date of reception (s)
 		message     -- message received
 		Never transmits
 		"""
-		sp = message.split()
-		sender = sp[0]
-		subject = sp[1]
-		data = sp[2:]
-		if subject == "anchor":
-			[level, x, y, z, parent] = data
-			level = int(level)
-			x = float(x)
-			y = float(y)
-			z = float(z)
-			if self.status == "UNLOCALIZED":
-				if level == 0:
-					self.master.append([(sender, (x,y,z))])
+		sender, subject, data = message
+		handlers = RECEIVE_HANDLERS.get(subject)
+		if handlers is not None:
+			handler = handlers[self.status]
+			if handler is not None:
+				getattr(self, handler)(time, sender, data)
+		return None
+	
+	def unlocalizedAnchor(self, time, sender, data):
+		# UNLOCALIZED node: builds the chains of anchors, and listens to the first one complete
+		[level, x, y, z, parent] = data
+		if level == 0:
+			self.master.append([(sender, (x,y,z))])
+		else:
+			for chain in self.master:
+				if len(chain) == level and chain[-1][0] == parent:
+					chain.append((sender, (x,y,z)))
+				if len(chain) == 4:
+					self.status = LISTENING
+					self.tdoaCalc = UPSCalculator(self.config)
+					for i in xrange(4):
+						a, position = chain[i]
+						self.tdoaCalc.addAnchor(i, position)
+					self.master = chain
+	
+	def localizedAnchor(self, time, sender, data):
+		[level, x, y, z, parent] = data
+		d = distance(self.positionEstimate, (x,y,z))
+		if self.level == level + 1 and d <= self.config.LSLS_SUBRANGE:
+			# LOCALIZED node received a "anchor" message of lower level: becomes candidate
+			self.status = CANDIDATE
+			self.master = (sender, d)
+			self.timer = time + self.candidateTimer(d)
+	
+	def candidateAnchor(self, time, sender, data):
+		[level, x, y, z, parent] = data
+		d = distance(self.positionEstimate, (x,y,z))
+		if level == self.level + 1 and d <= self.config.LSLS_SUBRANGE:
+			# CANDIDATE node received a "anchor" message of lower level: consider switching
+			t = time + self.candidateTimer(d)
+			if t < self.timer:
+				self.master = (sender, d)
+				self.timer = t
+		elif level == self.level and parent == self.master[0] and d <= self.config.LSLS_SUBRANGE:
+			# CANDIDATE node received a concurrent "anchor" message: become next-level candidate, or reset to LOCALIZED if the chain is complete
+			if self.level == 3:
+				self.status = LOCALIZED
+				self.level = 1
+				self.timer = float('inf')
+			else:
+				self.level += 1
+				self.master = (sender, d)
+				self.timer = time + self.candidateTimer(d)
+	
+	def candidateConfirm(self, time, sender, data):
+		[level, f, parent] = data
+		if level == self.level and parent == self.master[0]:
+			# CANDIDATE node received a concurrent "confirm" message: abandon, prepare for next round
+			self.status = LOCALIZED
+			self.level = (self.level % 3) + 1
+			self.timer = float('inf')
+	
+	def confirmingConfirm(self, time, sender, data):
+		[level, f, parent] = data
+		if level == self.level and parent == self.master[0]:
+			# CONFIRMING node received a concurrent "confirm" message: consider abandoning
+			if self.candidateTimer(self.master[1]) > f:
+				self.status = LOCALIZED
+				self.level = (self.level % 3) + 1
+				self.timer = float('inf')
+	
+	def unlocalizedBeacon(self, time, sender, data):
+		# UNLOCALIZED node: the chains of anchors are complete or abandoned, start again
+		self.master = []
+	
+	def listeningBeacon(self, time, sender, data):
+		[count, level, delay] = data
+		if self.master[level][0] == sender:
+			self.tdoaCalc.addDataPoint(level, count, (time, delay))
+			if level == 3 and count == self.config.UPS_NUMBER - 1:
+				# beacon sequence finished, LISTENING node tries to calculate its position
+				# import json
+				# print json.dumps(self.tdoaCalc.dataArchive, sort_keys=True, indent=4)
+				msg, position = self.tdoaCalc.getPosition()
+				if msg != "ok":
+					# localization failed, revert to UNLOCALIZED status
+					self.status = UNLOCALIZED
+					self.master = []
 				else:
-					for chain in self.master:
-						if len(chain) == level and chain[-1][0] == parent:
-							chain.append((sender, (x,y,z)))
-						if len(chain) == 4:
-							self.status = "LISTENING"
-							self.tdoaCalc = UPSCalculator()
-							for i in xrange(4):
-								a, position = chain[i]
-								self.tdoaCalc.addAnchor(i, position)
-							self.master = chain
-			elif self.status == "LISTENING":
-				pass
-			elif self.status == "LOCALIZED":
-				d = distance(self.positionEstimate, (x,y,z))
-				if self.level == level + 1 and d <= LSLS_SUBRANGE:
-					# LOCALIZED node received a "anchor" message of lower level: becomes candidate
-					self.status = "CANDIDATE"
-					self.master = (sender, d)
+					# localization successful, become CANDIDATE level 0
+					self.positionEstimate = position
+					# self.errorEstimate = e
+					self.status = CANDIDATE
+					self.setCategory(LOCALIZED_CATEGORY)
+					self.level = 0
+					# calculate the anchor center
+					center = sum([ np.array(p) for a,p in self.master ]) / 4
+					d = distance(self.positionEstimate, center)
+					self.master = ("master", d)
 					self.timer = time + self.candidateTimer(d)
-			elif self.status == "CANDIDATE":
-				d = distance(self.positionEstimate, (x,y,z))
-				if level == self.level + 1 and d <= LSLS_SUBRANGE:
-					# CANDIDATE node received a "anchor" message of lower level: consider switching
-					t = time + self.candidateTimer(d)
-					if t < self.timer:
-						self.master = (sender, d)
-						self.timer = t
-				elif level == self.level and parent == self.master[0] and d <= LSLS_SUBRANGE:
-					# CANDIDATE node received a concurrent "anchor" message: become next-level candidate, or reset to LOCALIZED if the chain is complete
-					if self.level == 3:
-						self.status = "LOCALIZED"
-						self.level = 1
-						self.timer = float('inf')
-					else:
-						self.level += 1
-						self.master = (sender, d)
-						self.timer = time + self.candidateTimer(d)
-			elif self.status == "CONFIRMING":
-				pass    # it should not be possible to receive a "anchor" message with the same parent during the confirmation stage
-			elif self.status == "ANCHOR":
-				pass
-		elif subject == "confirm":
-			[level, f, parent] = data
-			level = int(level)
-			f = float(f)
-			if self.status == "UNLOCALIZED":
-				pass
-			elif self.status == "LISTENING":
-				pass
-			elif self.status == "LOCALIZED":
-				pass
-			elif self.status == "CANDIDATE":
-				if level == self.level and parent == self.master[0]:
-					# CANDIDATE node received a concurrent "confirm" message: abandon, prepare for next round
-					self.status = "LOCALIZED"
-					self.level = (self.level % 3) + 1
-					self.timer = float('inf')
-			elif self.status == "CONFIRMING":
-				if level == self.level and parent == self.master[0]:
-					# CONFIRMING node received a concurrent "confirm" message: consider abandoning
-					if self.candidateTimer(self.master[1]) > f:
-						self.status = "LOCALIZED"
-						self.level = (self.level % 3) + 1
-						self.timer = float('inf')
-			elif self.status == "ANCHOR":
-				pass
-		elif subject == "beacon":
-			[count, level, delay] = data
-			count = int(count)
-			level = int(level)
-			delay = float(delay)
-			if self.status == "UNLOCALIZED":
-				self.master = []
-			elif self.status == "LISTENING":
-				if self.master[level][0] == sender:
-					self.tdoaCalc.addDataPoint(level, count, (time, delay))
-					if level == 3 and count == UPS_NUMBER - 1:
-						# beacon sequence finished, LISTENING node tries to calculate its position
-						# import json
-						# print json.dumps(self.tdoaCalc.dataArchive, sort_keys=True, indent=4)
-						msg, position = self.tdoaCalc.getPosition()
-						if msg != "ok":
-							# localization failed, revert to UNLOCALIZED status
-							self.status = "UNLOCALIZED"
-							self.master = []
-						else:
-							# localization successful, become CANDIDATE level 0
-							self.positionEstimate = position
-							# self.errorEstimate = e
-							self.status = "CANDIDATE"
-							self.level = 0
-							# calculate the anchor center
-							center = sum([ np.array(p) for a,p in self.master ]) / 4
-							d = distance(self.positionEstimate, center)
-							self.master = ("master", d)
-							self.timer = time + self.candidateTimer(d)
-			elif self.status == "LOCALIZED":
-				self.level = 1
-			elif self.status == "CANDIDATE":
-				pass
-			elif self.status == "CONFIRMING":
-				pass
-			elif self.status == "ANCHOR":
-				parent, d = self.master
-				if parent == sender and self.level == level + 1:
-					self.timer = time - d/SND_SPEED - delay         # trigger a beacon at next tick, and indicate the time origin to use
-					self.beaconCount = count
-		return ""
+	
+	def localizedBeacon(self, time, sender, data):
+		self.level = 1
+	
+	def anchorBeacon(self, time, sender, data):
+		[count, level, delay] = data
+		parent, d = self.master
+		if parent == sender and self.level == level + 1:
+			self.timer = time - d/self.config.SND_SPEED - delay         # trigger a beacon at next tick, and indicate the time origin to use
+			self.beaconCount = count
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		The node only acts when its timer expires
+		"""
+		return self.timer
 	
 	def standardTimer(self):
 		"""A duration equal to the max transmission range divided by the speed of sound.
 		Multiples of this are used as timers for various stages
 		Returns: time (s)
 		"""
-		r = float(SIM_RANGE)
-		v = float(SND_SPEED)
+		r = float(self.config.SIM_RANGE)
+		v = float(self.config.SND_SPEED)
 		return r/v
 	
 	def candidateTimer(self, d):
@@ -219,9 +224,9 @@ class LSLSNode(UWNode):
 		d           -- distance the parent anchor
 		Returns: time (s)
 		"""
-		k = LSLS_WAITFACTOR
-		r = float(SIM_RANGE)
-		v = float(SND_SPEED)
+		k = self.config.LSLS_WAITFACTOR
+		r = float(self.config.SIM_RANGE)
+		v = float(self.config.SND_SPEED)
 		# if self.level == 0:
 		# 	return k * (r - d) / v
 		# else:
@@ -232,11 +237,24 @@ class LSLSNode(UWNode):
 		"""Makes the node start the simulation as a master anchor node
 		Should be called on a single localized node
 		"""
-		self.status = "CONFIRMING"      # necessary to trigger the anchor message
+		self.status = CONFIRMING        # necessary to trigger the anchor message
 		self.level = 0
 		self.master = ("master", 0)
 		self.timer = -1
 	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		Candidates and anchors keep the estimate they were elected with
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
+		"""
+		if self.status in (UNLOCALIZED, LISTENING):
+			return None
+		return self.positionEstimate
+	
+	def statusNames(self):
+		"""Returns the name of the status of the node, in a list as for the other protocols, e.g. ["CANDIDATE"]"""
+		return [STATUS_NAMES[self.status]]
+	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot
 		plot        -- matplotlib plot in which the node must display itself
@@ -249,10 +267,27 @@ class LSLSNode(UWNode):
 			"CANDIDATE":       ("orange",   's'),
 			"CONFIRMING":      ("orange",   's'),
 			"ANCHOR":          ("red",      's')
-		}[self.status]
+		}[STATUS_NAMES[self.status]]
 		plot.scatter(x, y, z, c=color, marker=mark, lw=0)
 		if self.positionEstimate is not None:
 			ex, ey, ez = self.positionEstimate
 			plot.scatter(ex, ey, ez, c=color, marker='+')
 			# plot.scatter(ex, ey, ez, c=(0,0,0,0.2), marker='o', lw=0, s=20*self.errorEstimate)
 			plot.plot([x,ex], [y,ey], [z,ez], 'k:')
+
+# behavior of the nodes when their timer expires, by status: names of the methods called (None: nothing to do)
+# the methods are looked up on the node when called, so that they can be replaced (e.g. by the profiler)
+TICK_HANDLERS = [ None                      # UNLOCALIZED
+                , None                      # LISTENING
+                , None                      # LOCALIZED
+                , "tickCandidate"           # CANDIDATE
+                , "tickConfirming"          # CONFIRMING
+                , "tickAnchor"              # ANCHOR
+                ]
+# handling of the messages received, by subject and status of the recipient: names of the methods called (None: ignored)
+RECEIVE_HANDLERS = {
+	#              UNLOCALIZED           LISTENING            LOCALIZED            CANDIDATE            CONFIRMING            ANCHOR
+	"anchor":   [ "unlocalizedAnchor", None,                "localizedAnchor",   "candidateAnchor",   None,                 None ],
+	"confirm":  [ None,                None,                None,                "candidateConfirm",  "confirmingConfirm",  None ],
+	"beacon":   [ "unlocalizedBeacon", "listeningBeacon",   "localizedBeacon",   None,                None,                 "anchorBeacon" ]
+}
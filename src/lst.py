@@ -1,14 +1,24 @@
 #!/usr/bin/env python
 
-from parameters import *
 from SimEnvironment import SimEnvironment, distance
-from UWNode import UWNode
+from UWNode import UWNode, UNLOCALIZED, LOCALIZED, CATEGORIES
+from Message import Message
 from PositionCalculator import TOACalculator, TDOACalculator
 
 import numpy as np
 
+# secondary status of the nodes, the primary status being their category (UNLOCALIZED or LOCALIZED)
+WAITING = 0         # UNLOCALIZED: less than 3 localized neighbors
+READY = 1           # UNLOCALIZED: waiting for a time slot to call the neighbors
+LOCALIZING = 2      # UNLOCALIZED: collecting the replies of the neighbors
+NEW = 3             # LOCALIZED: waiting for a time slot to broadcast the position
+IDLE = 4            # LOCALIZED: replying to the calls of the neighbors
+STATUS_NAMES = ["waiting", "ready", "localizing", "new", "idle"]
+
 class LSTNode(UWNode):
 	"""Node class implementing Large Scale TOA"""
+	__slots__ = ("status", "slotTimer", "neighbors", "calculator", "timestamp", "positionEstimate",
+	             "TDOAtime", "TDOAmaster", "TDOAcalc")
 	
 	slotNumber = 0  # number of time slots in a full cycle
 	
@@ -30,7 +40,9 @@ class LSTNode(UWNode):
 		name = "node-" + str(id)
 		UWNode.__init__(self, name, position)
 		# common attributes
-		self.status = ["LOCALIZED", "new"] if localized else ["UNLOCALIZED", "waiting"]
+		self.status = NEW if localized else WAITING     # secondary status, see STATUS_NAMES
+		if localized:
+			self.setCategory(LOCALIZED)
 		self.slotTimer = id             # timer indicating the next timeslot (unit: timeslot length)
 		LSTNode.slotNumber = max(id+1, LSTNode.slotNumber)
 		self.neighbors = {}             # associates a  position to each neighbor's name
@@ -48,33 +60,34 @@ class LSTNode(UWNode):
 	def tick(self, time):
 		"""Function called every tick, lets the node perform operations
 		time        -- date of polling (s)
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
 		
-		if time / LST_TIMESLOT >= self.slotTimer:
+		if time / self.config.LST_TIMESLOT >= self.slotTimer:
 			self.slotTimer += LSTNode.slotNumber
 			timeslotOpen = True
 		else:
 			timeslotOpen = False
 		
-		if self.status[0] == "UNLOCALIZED":
+		if self.category == UNLOCALIZED:
 			
-			if self.status[1] == "waiting":
+			if self.status == WAITING:
 				pass
 			
-			if self.status[1] == "ready":
+			if self.status == READY:
 				if timeslotOpen:
-					self.status[1] = "localizing"
+					self.status = LOCALIZING
 					self.timestamp = time
-					self.calculator = TOACalculator(self.positionEstimate)
-					return self.name + " call"
+					self.calculator = TOACalculator(self.positionEstimate, self.config)
+					return Message(self.name, "call", ())
 			
-			if self.status[1] == "localizing":
-				if time > self.timestamp + LST_TIMESLOT:
+			if self.status == LOCALIZING:
+				if time > self.timestamp + self.config.LST_TIMESLOT:
 					msg, position = self.calculator.getPosition()
 					print self.name, "localization:", msg, position
 					if msg == "ok":
-						self.status = ["LOCALIZED", "new"]
+						self.status = NEW
+						self.setCategory(LOCALIZED)
 						self.positionEstimate = position
 						# for data analysis
 						LSTNode.toaDataX.append(time)
@@ -83,46 +96,40 @@ class LSTNode(UWNode):
 					else:
 						if len(self.calculator.anchors) < len(self.neighbors):
 							# not all neighbors replied, try again
-							self.status[1] = "ready"
+							self.status = READY
 						else:
 							# otherwise wait for more neighbors
-							self.status[1] = "waiting"
+							self.status = WAITING
 					self.calculator = None
 			
-		if self.status[0] == "LOCALIZED":
+		if self.category == LOCALIZED:
 			
-			if self.status[1] == "new":
+			if self.status == NEW:
 				if timeslotOpen:
-					self.status[1] = "idle"
+					self.status = IDLE
 					x, y, z = self.positionEstimate
-					return self.name + " position " + str(x) + " " + str(y) + " " + str(z)
+					return Message(self.name, "position", (float(x), float(y), float(z)))
 			
-			if self.status[1] == "idle":
+			if self.status == IDLE:
 				pass
 		
-		return ""
+		return None
 	
 	def receive(self, time, message):
 		"""Function called when a message broadcast by another node arrives at the node
 		time        -- date of reception (s)
 		message     -- message received
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
-		words = message.split()
-		sender = words[0]
-		subject = words[1]
-		data = words[2:]
+		sender, subject, data = message
 		
 		if subject == "position":
-			x = float(data[0])
-			y = float(data[1])
-			z = float(data[2])
-			position = np.array([x, y, z])
+			position = np.array(data)
 			# add to the list of neighbor
 			self.neighbors[sender] = position
 			# change state if applicable
-			if self.status == ["UNLOCALIZED", "waiting"] and len(self.neighbors) >= 3:
-				self.status[1] = "ready"
+			if self.status == WAITING and len(self.neighbors) >= 3:
+				self.status = READY
 			
 			# experimental TDOA
 			if self.TDOAmaster == sender:
@@ -142,46 +149,70 @@ class LSTNode(UWNode):
 				self.TDOAmaster = None
 		
 		if subject == "call":
-			if self.status[0] == "UNLOCALIZED" and self.calculator is None:
+			if self.category == UNLOCALIZED and self.calculator is None:
 				# experimental TDOA
 				self.TDOAmaster = sender
 				self.TDOAtime = time
-				self.TDOAcalc = TDOACalculator(self.positionEstimate)
+				self.TDOAcalc = TDOACalculator(self.positionEstimate, self.config)
 			
-			if self.status == ["LOCALIZED", "idle"]:
-				return self.name + " reply " + sender # this will be transmitted after a delay SIM_TICK
+			if self.status == IDLE:
+				return Message(self.name, "reply", (sender,)) # this will be transmitted after a delay SIM_TICK
 		
 		if subject == "reply":
 			recipient = data[0]
-			if self.status == ["UNLOCALIZED", "localizing"] and recipient == self.name:
+			if self.status == LOCALIZING and recipient == self.name:
 				if sender in self.neighbors:
 					self.calculator.addAnchor(sender, self.neighbors[sender])
-					self.calculator.addDataPoint(sender, 0, (time - self.timestamp, SIM_TICK))
+					self.calculator.addDataPoint(sender, 0, (time - self.timestamp, self.config.SIM_TICK))
 			
 			# experimental TDOA
 			elif self.TDOAmaster == recipient:
 				if sender in self.neighbors:
 					self.TDOAcalc.addAnchor(sender, self.neighbors[sender])
-					self.TDOAcalc.addDataPoint(sender, 0, (time, SIM_TICK))
+					self.TDOAcalc.addDataPoint(sender, 0, (time, self.config.SIM_TICK))
 		
-		return ""
+		return None
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		Returns the date from which the node must be ticked again (s), or inf if the node is dormant until it receives a message
+		"""
+		if self.status == IDLE:
+			return float('inf')     # final state, the time slots are not used anymore
+		slot = self.slotTimer * self.config.LST_TIMESLOT    # the slot timer must be kept up to date in all the other states
+		if self.status == LOCALIZING:
+			return min(slot, self.timestamp + self.config.LST_TIMESLOT)
+		return slot
+	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		Unlocalized nodes only have the starting point given for ToA, which is not an estimate
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
+		"""
+		return self.positionEstimate if self.category == LOCALIZED else None
+	
+	def statusNames(self):
+		"""Returns the names of the primary and secondary status of the node, e.g. ["UNLOCALIZED", "waiting"]"""
+		return [CATEGORIES[self.category], STATUS_NAMES[self.status]]
 	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot
 		plot        -- matplotlib plot in which the node must display itself
 		"""
 		x, y, z = self.position
+		primary, secondary = self.statusNames()
 		mark = {
 		    "UNLOCALIZED":  "s",
 		    "LOCALIZED":    "^"
-		}[self.status[0]]
+		}[primary]
 		color = {
 		    "waiting":      "gray",
 		    "ready":        "black",
 		    "localizing":   "red",
 		    "new":          "green",
 		    "idle":         "blue"
-		}[self.status[1]]
+		}[secondary]
 		plot.scatter(x, y, z, c=color, marker=mark, lw=0)
 		
 		ex, ey, ez = self.positionEstimate
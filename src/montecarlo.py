@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+# runs a scenario for several random seeds in parallel, and aggregates the results
+# usage: python montecarlo.py protocol R runs [processes] [NAME=value ...]
+# available protocols: lst, rls, hrls, lsls (R x R grid, as in test.py), ups (R x R sensors)
+# NAME=value changes a parameter of the simulations (e.g. SND_VAR=0.02) or an argument of the scenario (e.g. L=300)
+
+from parameters import Config
+from Scenario import GridScenario, UPSScenario
+from lst import LSTNode
+from rls import RLSNode
+from hrls import HRLSNode
+from lsls import LSLSNode
+
+from multiprocessing import Pool
+import numpy as np
+import sys
+import time as clock
+
+def runTask(task):
+	"""Runs one simulation in a worker process
+	task        -- (scenario, seed)
+	Returns the results of the simulation (see Scenario.run)
+	"""
+	scenario, seed = task
+	return scenario.run(seed)
+
+def runMany(scenario, seeds, processes = None):
+	"""Runs a scenario once for each seed, spreading the simulations over a pool of processes
+	The simulations are independent, so the time taken decreases linearly with the number of processes
+	scenario    -- scenario to run
+	seeds       -- random seeds of the simulations
+	processes   -- number of worker processes (default: number of cores)
+	Returns the results of the simulations, in the order of the seeds
+	"""
+	pool = Pool(processes)
+	try:
+		# one simulation per task: simulations are long and their durations vary, so they are handed out one by one
+		results = pool.map(runTask, [ (scenario, seed) for seed in seeds ], chunksize = 1)
+	finally:
+		pool.close()
+		pool.join()
+	return results
+
+def summarize(results):
+	"""Aggregates the results of several simulations of the same scenario
+	results     -- results of the simulations (see Scenario.run)
+	Returns a dictionary holding:
+	    runs            -- number of simulations
+	    localized       -- fraction of the evaluated nodes that localized themselves
+	    errors          -- (minimum, median, maximum, average, variance) of the localization errors (m)
+	    duration        -- (minimum, median, maximum) of the simulation durations (s)
+	    transmissions   -- (minimum, median, maximum) of the number of messages broadcast in a simulation, for each subject
+	                       the total is given under the subject "total"
+	"""
+	errors = np.array([ e for r in results for e in r["errors"] ])
+	found = errors[~np.isnan(errors)]
+	subjects = sorted(set( s for r in results for s in r["transmissions"] ))
+	counts = {}
+	for s in subjects:
+		counts[s] = [ r["transmissions"].get(s, 0) for r in results ]
+	counts["total"] = [ sum(r["transmissions"].values()) for r in results ]
+	spread = lambda values: (min(values), np.median(values), max(values))
+	return { "runs":           len(results)
+	       , "localized":      len(found) / float(len(errors)) if len(errors) > 0 else float('nan')
+	       , "errors":         (min(found), np.median(found), max(found), np.average(found), np.var(found)) if len(found) > 0 else None
+	       , "duration":       spread([ r["duration"] for r in results ])
+	       , "transmissions":  dict( (s, spread(c)) for s, c in counts.iteritems() )
+	       }
+
+def report(summary):
+	"""Prints a summary of results, in the format of the notes of test.py
+	summary     -- aggregated results (see summarize)
+	"""
+	print "%d runs" % summary["runs"]
+	print "localized     %.1f %%" % (100 * summary["localized"])
+	if summary["errors"] is not None:
+		print "error         %.3f/%.3f/%.3f (min/median/max)" % summary["errors"][:3]
+		print "              average %.3f, variance %.3f" % summary["errors"][3:]
+	print "duration      %d/%d/%d (min/median/max)" % summary["duration"]
+	transmissions = summary["transmissions"]
+	for s in sorted(transmissions.keys(), key = lambda s: (s == "total", s)):
+		print "{:14}{}/{}/{}".format('"' + s + '"' if s != "total" else s, *[ int(c) for c in transmissions[s] ])
+
+def parseValue(string):
+	"""Converts a parameter value given on the command line to an integer or a float when possible"""
+	for convert in (int, float):
+		try:
+			return convert(string)
+		except ValueError:
+			pass
+	return string
+
+scenarios = {      # class of the scenario used for each protocol, and its arguments
+	"lst":      (GridScenario, dict(nodeClass = LSTNode, anchors = 3, initialGuess = True, duration = 10000.)),
+	"rls":      (GridScenario, dict(nodeClass = RLSNode, duration = 20000.)),
+	"hrls":     (GridScenario, dict(nodeClass = HRLSNode, duration = 20000.)),
+	"lsls":     (GridScenario, dict(nodeClass = LSLSNode, L = 200., master = True, duration = 5000.,
+	                                layout = [ (0, 0, 0), (1.5, 0, 0), (0.5, 1.25, 0), (-0.25, 0.4, -280) ])),
+	"ups":      (UPSScenario, dict()),
+}
+
+def makeScenario(protocol, R, config = None, **options):
+	"""Creates the scenario used for a protocol
+	protocol    -- name of the protocol (see scenarios)
+	R           -- size of the deployment: number of nodes on each side of the grid (number of sensors: R x R for UPS)
+	config      -- parameters of the simulations (default: the global parameters, see parameters.Config)
+	options     -- arguments of the scenario replacing those of the protocol, e.g. L = 300.
+	Returns the scenario
+	"""
+	scenarioClass, arguments = scenarios[protocol]
+	arguments = dict(arguments, **options)
+	if scenarioClass is UPSScenario:
+		return UPSScenario(R * R, config = config, **arguments)
+	return GridScenario(R = R, config = config, **arguments)
+
+def parseSettings(arguments):
+	"""Reads settings NAME=value given on the command line
+	arguments   -- command line arguments of the form NAME=value
+	Returns a dictionary of parameters (see parameters.Config) and one of scenario arguments
+	"""
+	names = Config().parameters()
+	parameters = {}
+	options = {}
+	for argument in arguments:
+		name, value = argument.split("=", 1)
+		(parameters if name in names else options)[name] = parseValue(value)
+	return parameters, options
+
+if __name__ == "__main__":
+	if len(sys.argv) < 4 or sys.argv[1] not in scenarios:
+		print "usage: python montecarlo.py protocol R runs [processes] [NAME=value ...]"
+		print "available protocols: " + ", ".join(sorted(scenarios.keys()))
+		sys.exit(1)
+	settings = [ a for a in sys.argv[4:] if "=" in a ]
+	others = [ a for a in sys.argv[4:] if "=" not in a ]
+	parameters, options = parseSettings(settings)
+	scenario = makeScenario(sys.argv[1], int(sys.argv[2]), Config(**parameters), **options)
+	runs = int(sys.argv[3])
+	processes = int(others[0]) if len(others) > 0 else None
+	start = clock.time()
+	results = runMany(scenario, range(runs), processes)
+	print "%d simulations in %.1f s" % (runs, clock.time() - start)
+	report(summarize(results))
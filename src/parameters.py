@@ -10,6 +10,7 @@ SND_VAR             = 0.01      # standard deviation for the speed of sound rand
 SIM_RANGE           = 1000.     # maximum range a transmission can reach (m)
 SIM_LOSS            = 0.        # probability of a transmission not being received (0-1)
 SIM_TICK            = 0.1       # duration between two activations of the nodes (s)
+SIM_PERIOD          = 100.      # duration of the periods of time counted separately in the channel statistics (s)
 
 # UPS localization parameters
 UPS_PERIOD          = 1.        # duration between two successive beacon cycles (s)
@@ -28,6 +29,52 @@ RLS_TOLERANCE       = 5.        # maximum error for a position estimate to be ta
 # TOA calculation parameters
 TOA_ITERMAX         = 10        # maximum number of iterations of the Gauss-Newton method
 TOA_THRESHOLD       = 0.01      # variation threshold to stop the Gauss-Newton method
+TOA_RCOND           = 1e-10     # smallest singular value of the Jacobian, relative to the largest, for a Gauss-Newton step
+
+# position calculation parameters
+CALC_WINDOW         = 0         # data samples kept by the position calculators, the older ones being accumulated in running sums
+                                # (0: all the samples are kept until the position is calculated)
+                                # data points arriving after their sample was accumulated are lost, and counted in the attribute
+                                # dropped of the calculators: 2 samples are needed for the beacon series of UPS, whose samples overlap
 
 # LST paameters
-LST_TIMESLOT        = 2.        # length of a node's assigned time slot (s)
\ No newline at end of file
+LST_TIMESLOT        = 2.        # length of a node's assigned time slot (s)
+
+class Config:
+	"""Set of parameters of a simulation, shared by the simulation environment, its nodes and their calculators
+	Each simulation can be given its own configuration, so one process can simulate several configurations
+	"""
+	def __init__(self, **parameters):
+		"""Create a configuration
+		The parameters not given take the value of the global parameters of this module at the time of the creation
+		parameters  -- values of the parameters to change, e.g. Config(SND_VAR = 0.02, SIM_LOSS = 0.1)
+		"""
+		for name, value in globals().iteritems():
+			if name.isupper():
+				setattr(self, name, value)
+		self.set(**parameters)
+	
+	def set(self, **parameters):
+		"""Changes the value of some parameters
+		parameters  -- new values of the parameters, e.g. config.set(RLS_TIMESLOT = 4.)
+		"""
+		for name, value in parameters.iteritems():
+			if not (name.isupper() and hasattr(self, name)):
+				raise AttributeError("unknown parameter: " + name)
+			setattr(self, name, value)
+	
+	def copy(self, **parameters):
+		"""Creates a copy of the configuration
+		parameters  -- values of the parameters to change in the copy
+		Returns the new configuration
+		"""
+		config = Config(**self.parameters())
+		config.set(**parameters)
+		return config
+	
+	def parameters(self):
+		"""Returns a dictionary associating to the name of each parameter its value"""
+		return dict( (name, value) for name, value in vars(self).iteritems() if name.isupper() )
+	
+	def __repr__(self):
+		return "Config(" + ", ".join( "%s = %r" % item for item in sorted(self.parameters().items()) ) + ")"
@@ -1,16 +1,26 @@
 #!/usr/bin/env python
 
-from parameters import *
 from SimEnvironment import SimEnvironment, distance
-from UWNode import UWNode
+from UWNode import UWNode, LOCALIZED, ANCHOR
+from Message import Message
 from PositionCalculator import UPSCalculator
 
 import numpy as np
 from heapq import heappush, heappop
 from itertools import combinations
 
+# status of the nodes
+UP = 0      # unlocalized, passive: listening to the positions of the neighbors
+UA = 1      # unlocalized, active: requesting anchors in its next time slot
+LN = 2      # localized, new: broadcasting its position in its next time slot
+LR = 3      # localized, ready: may be requested as an anchor
+A = 4       # anchor
+STATUS_NAMES = ["UP", "UA", "LN", "LR", "A"]
+
 class RLSNode(UWNode):
 	"""Node class implementing the "reactive localization scheme"""
+	__slots__ = ("message", "status", "slotTimer", "neighbors", "listeningTimer", "tdoaCalc", "anchorErrors", "bestAnchors",
+	             "positionEstimates", "update", "anchorLevel", "anchorMaster", "masterDelay", "beaconTime", "beaconCount")
 	slotNumber = 0
 	def __init__(self, id, position = (-1,-1,0), localized = False):
 		"""Create a node
@@ -22,7 +32,9 @@ class RLSNode(UWNode):
 		UWNode.__init__(self, name, position)
 		# common attributes
 		self.message = None
-		self.status = "LN" if localized else "UP"
+		self.status = LN if localized else UP
+		if localized:
+			self.setCategory(LOCALIZED)
 		self.slotTimer = id
 		RLSNode.slotNumber = max(id+1, RLSNode.slotNumber)
 		# neighbor registration
@@ -47,101 +59,93 @@ class RLSNode(UWNode):
 	def tick(self, time):
 		"""Function called every tick, lets the node perform operations
 		time        -- date of polling (s)
-		Returns a string to be broadcast (if the string is empty, it is not broadcast)
+		Returns a message to be broadcast (None if nothing is broadcast)
 		"""
-		if self.status == "A" and self.beaconTime is not None:
-			if self.beaconCount == UPS_NUMBER:
-				self.status = "LR"
+		if self.status == A and self.beaconTime is not None:
+			if self.beaconCount == self.config.UPS_NUMBER:
+				self.status = LR
+				self.setCategory(LOCALIZED)
 			delay = time - self.beaconTime
 			self.beaconTime = None
-			beacon = self.name + " beacon " + str(self.anchorLevel) + " " + str(self.beaconCount) + " " + str(delay)
+			data = (self.anchorLevel, self.beaconCount, delay)
 			if self.update:
 				x, y, z, e = self.getPosition()
-				beacon += " " + str(x) + " " + str(y) + " " + str(z) + " " + str(e)
+				data += (float(x), float(y), float(z), float(e))
 				self.update = False
-			return beacon
+			return Message(self.name, "beacon", data)
 		
-		if time / RLS_TIMESLOT > self.slotTimer:
+		if time / self.config.RLS_TIMESLOT > self.slotTimer:
 			self.slotTimer += RLSNode.slotNumber
-			print str(time) + " " + self.name + " ping " + self.status
+			print str(time) + " " + self.name + " ping " + STATUS_NAMES[self.status]
 			
-			if self.status == "UP" and len(self.bestAnchors) > 0:
-				self.status = "UA"
-				return ""
+			if self.status == UP and len(self.bestAnchors) > 0:
+				self.status = UA
+				return None
 			
 			if time > self.listeningTimer:
 				
-				if self.status == "UA":
+				if self.status == UA:
 					s, n0, n1, n2, n3 = heappop(self.bestAnchors)
 					print "score:", s
 					if len(self.bestAnchors) == 0:
-						self.status = "UP"
-					return self.name + " request " + " ".join([n0, n1, n2, n3])
+						self.status = UP
+					return Message(self.name, "request", (n0, n1, n2, n3))
 				
-				if self.status == "LN":
-					self.status = "LR"
+				if self.status == LN:
+					self.status = LR
 					x, y, z, e = self.getPosition()
-					return self.name + " position " + str(x) + " " + str(y) + " " + str(z) + " " + str(e)
+					return Message(self.name, "position", (float(x), float(y), float(z), float(e)))
 				
-				if self.status == "A":
+				if self.status == A:
 					# anchor is orphaned
-					self.status = "LR"
+					self.status = LR
+					self.setCategory(LOCALIZED)
 		
-		return ""
+		return None
 
 	def receive(self, time, message):
 		"""Function called when a message broadcast by another node arrives at the node
 		time        -- date of reception (s)
 		message     -- message received
 		"""
-		words = message.split()
-		sender = words[0]
-		subject = words[1]
-		data = words[2:]
+		sender, subject, data = message
 		
 		if subject == "position":
-			x = float(data[0])
-			y = float(data[1])
-			z = float(data[2])
+			x, y, z, error = data
 			position = np.array([x, y, z])
-			error = float(data[3])
 			# if node is unlocalized, attempt to find a better anchor set
-			if self.status in ["UP", "UA"]:
+			if self.status in (UP, UA):
 				self.findAnchors(sender, position, error)
 			# add to the list of neighbor
 			self.neighbors[sender] = (position, error)
 			# revert to "unlocalized-passive" if needed
-			if self.status == "UA" and time/RLS_TIMESLOT > self.slotTimer - RLSNode.slotNumber/2:
-				self.status = "UP"
+			if self.status == UA and time/self.config.RLS_TIMESLOT > self.slotTimer - RLSNode.slotNumber/2:
+				self.status = UP
 		
 		if subject == "request":
-			if self.status == "LR" and self.name in data:
+			if self.status == LR and self.name in data:
 				i = data.index(self.name)
 				master = data[i-1 % 4]
 				if master not in self.neighbors:
-					return ""
-				self.status = "A"
+					return None
+				self.status = A
+				self.setCategory(ANCHOR)
 				self.anchorLevel = i
 				self.anchorMaster = master
 				p, e = self.neighbors[master]
 				d = distance(self.position, p)
-				self.masterDelay = d / SND_SPEED
+				self.masterDelay = d / self.config.SND_SPEED
 				if i == 0:
 					self.beaconTime = time
 					self.beaconCount = 1
 		
 		if subject == "beacon":
-			level = int(data[0])
-			count = int(data[1])
-			delay = float(data[2])
+			level, count, delay = data[:3]
 			if len(data) > 3:
-				x = float(data[3])
-				y = float(data[4])
-				z = float(data[5])
-				e = float(data[6])
+				x, y, z, e = data[3:]
 				self.neighbors[sender] = (np.array([x,y,z]), e)
-			if self.status == "A":
-				self.listeningTimer = time + 4 * RLS_TIMESLOT
+			if self.status == A:
+				self.listeningTimer = time + 4 * self.config.RLS_TIMESLOT
 				if sender == self.anchorMaster:
 					if self.anchorLevel == 0:
 						self.beaconCount += 1
@@ -150,14 +154,14 @@ class RLSNode(UWNode):
 						self.beaconCount = count
 						self.beaconTime = time - self.masterDelay - delay
 			else:
-				if self.status == "UA":
-					self.status = "UP"
-				self.listeningTimer = time + 2 * RLS_TIMESLOT
+				if self.status == UA:
+					self.status = UP
+				self.listeningTimer = time + 2 * self.config.RLS_TIMESLOT
 				# first beacon: new calculator
 				if count == 1 and level == 0:
-					self.tdoaCalc = UPSCalculator()
+					self.tdoaCalc = UPSCalculator(self.config)
 				elif self.tdoaCalc is None:
-					return ""
+					return None
 				# first cycle: register anchors
 				if count == 1:
 					position, error = self.neighbors[sender]
@@ -166,11 +170,11 @@ class RLSNode(UWNode):
 				else:
 					if len(self.tdoaCalc.anchors) < 4:
 						self.tdoaCalc = None
-						return ""
+						return None
 				# all cycles: register data
 				self.tdoaCalc.addDataPoint(sender, count, (time, delay))
 				# final beacon: calculate position
-				if count == UPS_NUMBER and level == 3:
+				if count == self.config.UPS_NUMBER and level == 3:
 					msg, position = self.tdoaCalc.getPosition()
 					self.tdoaCalc = None
 					print self.name + " calculating: " + msg
@@ -179,12 +183,32 @@ class RLSNode(UWNode):
 						x, y, z = position
 						error = 1 + max(self.anchorErrors)
 						self.positionEstimates.append((x,y,z, error))
-						if self.status in ["UP", "UA"]:
-							self.status = "LN"
-						if self.status == "LR":
+						if self.status in (UP, UA):
+							self.status = LN
+							self.setCategory(LOCALIZED)
+						if self.status == LR:
 							self.update = True
 		
-		return ""
+		return None
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		Returns the date from which the node must be ticked again (s)
+		"""
+		if self.status == A and self.beaconTime is not None:
+			return time             # beacon at next tick
+		return self.slotTimer * self.config.RLS_TIMESLOT    # everything else happens when the time slot opens
+	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		The estimate is the calculated position with the lowest error
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
+		"""
+		if len(self.positionEstimates) == 0:
+			return None
+		x, y, z, e = self.getPosition()
+		return (x, y, z)
 	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot
@@ -197,7 +221,7 @@ class RLSNode(UWNode):
 			"LN": ("blue",  '^'),
 			"LR": ("cyan",  '^'),
 			"A":  ("red",   's')
-		}[self.status]
+		}[STATUS_NAMES[self.status]]
 		plot.scatter(x, y, z, c=color, marker=mark, lw=0)
 		if len(self.positionEstimates) > 0:
 			ex, ey, ez, ee = self.getPosition()
@@ -208,7 +232,7 @@ class RLSNode(UWNode):
 	def findAnchors(self, newNode, position, error):
 		l = len(self.neighbors)
 		if l >= 3:
-			for n1, n2, n3 in combinations(self.neighbors.keys(), 3):
+			for n1, n2, n3 in combinations(sorted(self.neighbors), 3):
 				p1, e1 = self.neighbors[n1]
 				p2, e2 = self.neighbors[n2]
 				p3, e3 = self.neighbors[n3]
@@ -221,7 +245,7 @@ class RLSNode(UWNode):
 		# eliminate sets where nodes are too distant
 		for n1 in positions:
 			for n2 in positions:
-				if np.linalg.norm(n1-n2) > SIM_RANGE:
+				if np.linalg.norm(n1-n2) > self.config.SIM_RANGE:
 					return 0
 		# calculate the score
 		a = positions[1] - positions[0]
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+# runs a scenario over a grid of settings, storing the summary of each simulation in an SQLite database
+# usage: python sweep.py database protocol R seeds [processes] NAME=value1,value2,... [NAME=...]
+#        python sweep.py database               (prints the results stored in the database)
+# NAME is either a parameter (e.g. SND_VAR=0.01,0.02) or an argument of the scenario (e.g. L=300,400), see montecarlo.py
+# the simulations already in the database are skipped, so an interrupted sweep resumes where it stopped
+
+from parameters import Config
+from montecarlo import makeScenario, parseSettings, scenarios
+
+from multiprocessing import Pool
+import numpy as np
+import itertools
+import sqlite3
+import json
+import sys
+import time as clock
+
+def expand(grid):
+	"""Lists all the combinations of values of a grid of settings
+	grid        -- dictionary associating to each setting the list of its values
+	Returns the list of combinations, as dictionaries associating to each setting a value
+	"""
+	names = sorted(grid.keys())
+	return [ dict(zip(names, values)) for values in itertools.product(*[ grid[n] for n in names ]) ]
+
+def taskKey(task):
+	"""Identifies a simulation, independently of the order of its settings
+	task        -- (protocol, R, settings, seed)
+	Returns a canonical JSON string
+	"""
+	protocol, R, settings, seed = task
+	return json.dumps([protocol, R, settings, seed], sort_keys = True)
+
+def runTask(task):
+	"""Runs one simulation in a worker process
+	task        -- (protocol, R, settings, seed)
+	Returns the task and the summary of the simulation (see summarizeRun)
+	"""
+	protocol, R, settings, seed = task
+	parameters, options = parseSettings([ "%s=%s" % item for item in settings.iteritems() ])
+	scenario = makeScenario(protocol, R, Config(**parameters), **options)
+	start = clock.time()
+	result = scenario.run(seed)
+	return task, summarizeRun(result, clock.time() - start)
+
+def summarizeRun(result, wallTime):
+	"""Summarizes the results of a simulation
+	result      -- results of the simulation (see Scenario.run)
+	wallTime    -- time taken by the simulation (s)
+	Returns a dictionary holding:
+	    nodes           -- number of evaluated nodes
+	    localized       -- number of evaluated nodes that localized themselves
+	    errors          -- (minimum, median, maximum, average, variance) of the localization errors (m), None if no node localized
+	    duration        -- date of the last transmission (s)
+	    transmissions   -- number of messages broadcast for each subject
+	    wall            -- time taken by the simulation (s)
+	"""
+	errors = np.array(result["errors"])
+	found = errors[~np.isnan(errors)]
+	return { "nodes":          len(errors)
+	       , "localized":      len(found)
+	       , "errors":         (min(found), np.median(found), max(found), np.average(found), np.var(found)) if len(found) > 0 else None
+	       , "duration":       result["duration"]
+	       , "transmissions":  result["transmissions"]
+	       , "wall":           wallTime
+	       }
+
+class ResultStore:
+	"""SQLite database holding the summary of each simulation of a sweep
+	Each summary is written as soon as the simulation ends, so the results survive an interruption of the sweep
+	"""
+	def __init__(self, path):
+		"""Opens the database, creating it if needed
+		path        -- path of the database file
+		"""
+		self.connection = sqlite3.connect(path)
+		self.connection.execute("""CREATE TABLE IF NOT EXISTS runs (
+			key TEXT PRIMARY KEY,
+			protocol TEXT, R INTEGER, settings TEXT, seed INTEGER,
+			nodes INTEGER, localized INTEGER,
+			error_min REAL, error_median REAL, error_max REAL, error_average REAL, error_variance REAL,
+			duration REAL, transmissions TEXT, wall REAL)""")
+		self.connection.commit()
+	
+	def __contains__(self, task):
+		return self.connection.execute("SELECT 1 FROM runs WHERE key = ?", (taskKey(task),)).fetchone() is not None
+	
+	def add(self, task, summary):
+		"""Stores the summary of a simulation
+		task        -- (protocol, R, settings, seed)
+		summary     -- summary of the simulation (see summarizeRun)
+		"""
+		protocol, R, settings, seed = task
+		errors = summary["errors"] if summary["errors"] is not None else (None,) * 5
+		self.connection.execute("INSERT OR REPLACE INTO runs VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+		                        (taskKey(task), protocol, R, json.dumps(settings, sort_keys = True), seed,
+		                         summary["nodes"], summary["localized"]) + tuple(errors) +
+		                        (summary["duration"], json.dumps(summary["transmissions"], sort_keys = True), summary["wall"]))
+		self.connection.commit()
+	
+	def groups(self):
+		"""Gathers the stored simulations by scenario and settings
+		Returns a list of (protocol, R, settings, rows), each row being a dictionary of the columns of a simulation
+		"""
+		cursor = self.connection.execute("SELECT * FROM runs ORDER BY protocol, R, settings, seed")
+		columns = [ c[0] for c in cursor.description ]
+		rows = [ dict(zip(columns, row)) for row in cursor ]
+		return [ (protocol, R, json.loads(settings), list(group))
+		         for (protocol, R, settings), group in itertools.groupby(rows, lambda r: (r["protocol"], r["R"], r["settings"])) ]
+	
+	def close(self):
+		self.connection.close()
+
+def sweep(store, protocol, R, grid, seeds, processes = None):
+	"""Runs a scenario for every combination of settings and every seed, skipping the simulations already stored
+	The simulations are spread over a pool of processes, the summaries are written by this process only
+	store       -- result store
+	protocol    -- name of the protocol (see montecarlo.scenarios)
+	R           -- size of the deployment (see montecarlo.makeScenario)
+	grid        -- dictionary associating to each setting (parameter or argument of the scenario) the list of its values
+	seeds       -- random seeds of the simulations of each combination
+	processes   -- number of worker processes (default: number of cores)
+	"""
+	tasks = [ (protocol, R, settings, seed) for settings in expand(grid) for seed in seeds ]
+	pending = [ t for t in tasks if t not in store ]
+	print "%d simulations, %d already done" % (len(tasks), len(tasks) - len(pending))
+	if len(pending) == 0:
+		return
+	pool = Pool(processes)
+	try:
+		start = clock.time()
+		for n, (task, summary) in enumerate(pool.imap_unordered(runTask, pending, chunksize = 1)):
+			store.add(task, summary)
+			print "%d/%d  %.0f s  seed %d  %s" % (n + 1, len(pending), clock.time() - start, task[3], json.dumps(task[2], sort_keys = True))
+	finally:
+		pool.terminate()
+		pool.join()
+
+def report(store):
+	"""Prints the results stored, aggregated over the seeds of each combination of settings
+	store       -- result store
+	"""
+	for protocol, R, settings, rows in store.groups():
+		errors = [ r["error_median"] for r in rows if r["error_median"] is not None ]
+		totals = [ sum(json.loads(r["transmissions"]).values()) for r in rows ]
+		print "%s R=%d %s" % (protocol, R, json.dumps(settings, sort_keys = True))
+		print "    %d runs, %.1f %% localized, median error %s, %d transmissions, ends at %d s (medians)" % (
+		      len(rows), 100. * sum(r["localized"] for r in rows) / max(1, sum(r["nodes"] for r in rows)),
+		      "%.3f" % np.median(errors) if len(errors) > 0 else "-",
+		      np.median(totals), np.median([ r["duration"] for r in rows ]))
+
+if __name__ == "__main__":
+	if len(sys.argv) == 2:
+		store = ResultStore(sys.argv[1])
+		report(store)
+		store.close()
+		sys.exit(0)
+	if len(sys.argv) < 5 or sys.argv[2] not in scenarios:
+		print "usage: python sweep.py database protocol R seeds [processes] NAME=value1,value2,... [NAME=...]"
+		print "       python sweep.py database"
+		print "available protocols: " + ", ".join(sorted(scenarios.keys()))
+		sys.exit(1)
+	grid = {}
+	processes = None
+	for argument in sys.argv[5:]:
+		if "=" in argument:
+			name, values = argument.split("=", 1)
+			grid[name] = values.split(",")
+		else:
+			processes = int(argument)
+	# the values are kept as given, so that the same command line always gives the same keys
+	store = ResultStore(sys.argv[1])
+	try:
+		sweep(store, sys.argv[2], int(sys.argv[3]), grid, range(int(sys.argv[4])), processes)
+	finally:
+		store.close()
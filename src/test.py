@@ -1,14 +1,7 @@
 #!/usr/bin/env python
 
-import parameters
-
-parameters.SIM_LOSS = 0
-parameters.SND_VAR = 0.02
-parameters.TOA_ITERMAX = 20
-
-# modify parameters BEFORE importing anything that depends on it
-
-from SimEnvironment import SimEnvironment, distance
+from parameters import Config
+from SimEnvironment import SimEnvironment, distance, allLocalized
 from rls import RLSNode
 from lsls import LSLSNode
 from ups import MasterAnchorNode, AnchorNode, SensorNode
@@ -27,7 +20,8 @@ import numpy as np
 D = 4000  # side of the simulation area
 L = 400   # distance between two node
 
-sim = SimEnvironment((D, D, 500))
+config = Config(SIM_LOSS = 0, SND_VAR = 0.02, TOA_ITERMAX = 20)
+sim = SimEnvironment((D, D, 500), config = config)
 
 # add initial anchors
 
@@ -60,14 +54,14 @@ for i in xrange(R):
 		sim.addNode(node)
 		n += 1
 
-# run the simulation (logging on, show begining and end)
+# run the simulation until all the nodes are localized (logging on, show begining and end)
 
-sim.run(3000, show=000, verbose=True)
+convergence = sim.run(3000, show=000, verbose=True, until=allLocalized)
 
 # log the results
 
 for n in sim.nodes:
-	print n.name + "   \t" + n.status[0]
+	print n.name + "   \t" + n.statusNames()[0]
 	ap = np.array(n.position)
 	print " actual position     " + str(ap)
 	ep = np.array(n.positionEstimate)
@@ -75,6 +69,15 @@ for n in sim.nodes:
 	print " estimated position  " + str(ep)
 	print " error               " + str(d)
 
+print ""
+statistics = sim.statistics()
+print "ends in %d s" % statistics["end"]
+if convergence is not None:
+	print "all nodes localized in %d s" % convergence
+for subject, counts in sorted(statistics["subjects"].items()):
+	print "%5d  \"%s\"" % (counts["transmissions"], subject)
+print "%5d total" % statistics["total"]["transmissions"]
+
 print ""
 print "TOA localization"
 print "minimum   ", min        (LSTNode.toaDataY)
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 
-from parameters import *
 from SimEnvironment import SimEnvironment, distance
-from UWNode import UWNode
+from UWNode import UWNode, LOCALIZED, ANCHOR
+from Message import Message
 from PositionCalculator import UPSCalculator
 
 class AnchorNode(UWNode):
@@ -15,6 +15,7 @@ class AnchorNode(UWNode):
 		"""
 		name = "anchor" + str(priority)
 		UWNode.__init__(self, name, position)
+		self.setCategory(ANCHOR)
 		self.priority = priority
 		self.beaconCount = 0                    # number of beacons already performed
 		self.distanceToPrevious	= None          # distance to the anchor immediately before
@@ -25,15 +26,15 @@ class AnchorNode(UWNode):
 		time        -- date of polling (s)
 		If the anchor node is next in line to beacon, sends out a message: position + beaconing delay
 		"""
-		message = ""
+		message = None
 		if self.timeOrigin is not None:
 			x, y, z = self.position
 			delay = time - self.timeOrigin
-			message = str(self.beaconCount) + " " + str(self.priority) + " " + str(x) + " " + str(y) + " " + str(z) + " " + str(delay)
+			message = Message(self.name, "beacon", (self.beaconCount, self.priority, float(x), float(y), float(z), delay))
 			self.timeOrigin = None
 			
-		if len(message) > 0:
-			print "{:6}".format("%.3f" % time) + " -- " + self.name + " sending: " + message
+		if message is not None:
+			print "{:6}".format("%.3f" % time) + " -- " + self.name + " sending: " + str(message)
 			pass
 		return message
 	
@@ -43,15 +44,28 @@ class AnchorNode(UWNode):
 		message     -- message received
 		Never transmits
 		"""
-		priority = int(message.split()[1])
+		beaconCount, priority, x, y, z, delay = message.data
 		if priority + 1 == self.priority:
-			# print "{:6}".format("%.3f" % time) + " -- " + self.name + " received beacon: " + message
-			self.beaconCount = int(message.split()[0])
-			x, y, z, delay = [ float(i) for i in message.split()[2:6] ]
+			# print "{:6}".format("%.3f" % time) + " -- " + self.name + " received beacon: " + str(message)
+			self.beaconCount = beaconCount
 			if self.distanceToPrevious is None:
 				self.distanceToPrevious = distance(self.position, (x,y,z))
-			self.timeOrigin = time - (self.distanceToPrevious / SND_SPEED) - delay
-		return ""
+			self.timeOrigin = time - (self.distanceToPrevious / self.config.SND_SPEED) - delay
+		return None
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		The anchor node only needs to be ticked when it is next in line to beacon
+		"""
+		return time if self.timeOrigin is not None else float('inf')
+	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		Anchors know their position
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
+		"""
+		return self.position
 	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot
@@ -72,13 +86,20 @@ class MasterAnchorNode(AnchorNode):
 		time        -- date of polling (s)
 		If the anchor node is next in line to beacon, sends out a message: position + beaconing delay
 		"""
-		message = ""
-		if time >= self.nextBeaconTime and self.beaconCount < UPS_NUMBER:
+		message = None
+		if time >= self.nextBeaconTime and self.beaconCount < self.config.UPS_NUMBER:
 			self.timeOrigin = time      # we set the origin as the time of beaconing of the master
 			message = AnchorNode.tick(self, time)
-			self.nextBeaconTime += UPS_PERIOD
+			self.nextBeaconTime += self.config.UPS_PERIOD
 			self.beaconCount += 1
 		return message
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		The master anchor node only needs to be ticked when its next beaconing sequence starts
+		"""
+		return self.nextBeaconTime if self.beaconCount < self.config.UPS_NUMBER else float('inf')
 
 class SensorNode(UWNode):
 	"""Node that does not know its position, and calculates it by listening to the beacons"""
@@ -88,7 +109,7 @@ class SensorNode(UWNode):
 		"""
 		name = "sensor" + str(nb)
 		UWNode.__init__(self, name)
-		self.calculator = UPSCalculator()
+		self.calculator = None          # created with the first beacon, once the node uses the parameters of the simulation
 		self.timeout = float('inf')
 		self.positionEstimate = None
 		# self.errorEstimate = 0
@@ -112,8 +133,9 @@ class SensorNode(UWNode):
 				# print "        error estimate: " + "%.3f" % e
 				self.positionEstimate = position
 				# self.errorEstimate = e
+				self.setCategory(LOCALIZED)
 			self.timeout = float('inf')
-		return ""
+		return None
 	
 	def receive(self, time, message):
 		"""Function called when a message broadcast by another node arrives at the node
@@ -121,14 +143,28 @@ class SensorNode(UWNode):
 		message     -- message received
 		Never transmits
 		"""
-		# print "{:6}".format("%.3f" % time) + " -- " + self.name + " received beacon: " + message
-		beaconCount = int(message.split()[0])
-		anchor = int(message.split()[1])
-		x, y, z, delay = [ float(i) for i in message.split()[2:6] ]
+		# print "{:6}".format("%.3f" % time) + " -- " + self.name + " received beacon: " + str(message)
+		beaconCount, anchor, x, y, z, delay = message.data
+		if self.calculator is None:
+			self.calculator = UPSCalculator(self.config)
 		self.calculator.addAnchor(anchor, (x, y, z))
 		self.calculator.addDataPoint(anchor, beaconCount, (time, delay))
 		self.timeout = time + 5        # arbitrary 5-second timeout
-		return ""
+		return None
+	
+	def nextTick(self, time):
+		"""Function called after every tick and reception, lets the node tell when it next needs to be ticked
+		time        -- current date (s)
+		The sensor node only needs to be ticked when its timeout expires
+		"""
+		return self.timeout
+	
+	def estimate(self):
+		"""Gives the position the node has found for itself
+		The estimate is available once the sensor has heard all the beacon cycles
+		Returns the estimated X,Y,Z coordinates (m,m,m), or None if the node is not localized
+		"""
+		return self.positionEstimate
 	
 	def display(self, plot):
 		"""Displays a representation of the node in a 3D plot